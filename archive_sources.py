@@ -0,0 +1,77 @@
+import io
+import tarfile
+import tokenize
+import zipfile
+
+ARCHIVE_SUFFIXES = ('.zip', '.whl', '.tar.gz', '.tgz', '.tar', '.tar.bz2', '.tar.xz')
+
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+
+def decode_source(data):
+    """ Decode Python source bytes with the encoding declared in the file (PEP 263), utf-8 by default. """
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    return data.decode(encoding)
+
+
+def iter_archive_members(archive):
+    """
+    Yield (member name, bytes) for every .py member of a zip, wheel or tar archive.
+
+    Tar archives are read as a stream, so they are never seeked or extracted to disk.
+    """
+    if archive.endswith(('.zip', '.whl')):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.endswith('.py'):
+                    yield info.filename, zf.read(info)
+    else:
+        with tarfile.open(archive, 'r|*') as tf:
+            for member in tf:
+                if member.isfile() and member.name.endswith('.py'):
+                    yield member.name, tf.extractfile(member).read()
+
+
+def iter_sources(filename):
+    """
+    Yield (label, source code, error) for a Python file, or for each .py member of an archive.
+
+    Members that cannot be decoded are reported with their error instead of stopping the
+    archive. Labels of members are "archive!member".
+    """
+    if not is_archive(filename):
+        with open(filename, 'rb') as file:
+            yield filename, decode_source(file.read()), None
+        return
+    for name, data in iter_archive_members(filename):
+        label = f"{filename}!{name}"
+        try:
+            yield label, decode_source(data), None
+        except (SyntaxError, UnicodeDecodeError, LookupError) as e:
+            yield label, None, str(e)
+
+
+def iter_source_records(filename, records_fn, errors):
+    """
+    Yield the records of a Python file or of every .py member of an archive.
+
+    Each archive member is isolated: a member that fails to decode or parse is added to
+    errors as (label, message) and the next member is read. Errors of a plain file are raised.
+    :param filename: Python file or archive.
+    :param records_fn: Function turning source code into an iterable of records.
+    :param errors: List the (label, error) of skipped archive members are appended to.
+    """
+    isolate = is_archive(filename)
+    for label, source_code, error in iter_sources(filename):
+        if error is not None:
+            errors.append((label, error))
+            continue
+        try:
+            for record in records_fn(source_code): # records_fn may be lazy, so errors can surface while iterating
+                yield record
+        except Exception as e:
+            if not isolate:
+                raise
+            errors.append((label, str(e)))
@@ -0,0 +1,51 @@
+import argparse
+import json
+import socket
+from python_autocommenter import collect_python_files, prepare_file, write_files
+
+default_socket = "/tmp/autocommenter.sock"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add Comments to Python Files using a running autocommenter_server.py")
+    parser.add_argument("filename", type=str, nargs="+", help="Python files, directories or glob patterns to process")
+    parser.add_argument("--socket", type=str, default=default_socket, help="Unix socket the server listens on")
+    parser.add_argument("--writer", choices=["splice", "astor"], default="splice", help="How the commented functions are written back")
+    return parser.parse_args()
+
+
+def request_comments(functions, socket_path=default_socket, writer="splice"):
+    """
+    Send functions to the server and wait for the commented versions.
+
+    :param functions: List of function source strings, as returned by find_functions_with_comments.
+    :param socket_path: Unix socket the server listens on.
+    :param writer: Writer the outputs are for; only "splice" lets the server cut replies after the docstring.
+    :return: Tuple of (generated functions or docstrings in the same order, server output mode).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps({"functions": functions, "writer": writer}) + "\n").encode('utf-8'))
+        with connection.makefile('r', encoding='utf-8') as reader:
+            response = json.loads(reader.readline())
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response["outputs"], response.get("output_mode", "function")
+
+
+def comment_files_remote(filenames, socket_path=default_socket, writer="splice"):
+    """ Same as comment_files, but generation happens in the server process. """
+    prepared = [prepare_file(filename) for filename in filenames]
+    all_functions = [func for _, _, _, functions, _ in prepared for func in functions.values()]
+    modified_funcs, output_mode = request_comments(all_functions, socket_path, writer) if all_functions else ([], "function")
+    return write_files(prepared, modified_funcs, writer, output_mode)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        summary = comment_files_remote(collect_python_files(args.filename), args.socket, args.writer)
+        for filename, result in summary.items():
+            print(f"{filename}: {result}")
+    except Exception as e:
+        print(f"Error processing the files: {e}")
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from python_autocommenter import generate_functions
+from inference_backends import backends, get_backend, backend_options
+from docstring_cache import DocstringCache
+
+default_socket = "/tmp/autocommenter.sock"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Keep the fine-tuned model loaded and comment functions for autocommenter_client.py")
+    parser.add_argument("--socket", type=str, default=default_socket, help="Unix socket to listen on")
+    parser.add_argument("--batch-size", type=int, default=8, help="Maximum number of functions per generate call")
+    parser.add_argument("--token-budget", type=int, default=None, help="Maximum padded prompt plus new tokens per generate call")
+    parser.add_argument("--max-wait-ms", type=int, default=20, help="How long to wait for more requests before running a partial batch")
+    parser.add_argument("--cache-dir", type=str, default=".autocommenter_cache", help="Directory of the persistent docstring cache")
+    parser.add_argument("--backend", choices=sorted(backends), default="unsloth", help="unsloth (CUDA), transformers (CPU), cpu-pool (several CPU worker processes) or stub (no model, for tests)")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="cpu-pool: number of worker processes, each holding a model copy")
+    parser.add_argument("--cpu-threads", type=int, default=None, help="cpu-pool: torch threads per worker")
+    parser.add_argument("--quantize-int8", action="store_true", help="cpu-pool: quantize Linear layers to int8 with torch dynamic quantization")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Re-encode the instruction prompt for every function instead of reusing its KV cache")
+    parser.add_argument("--output-mode", choices=["function", "docstring"], default="function", help="Generate whole commented functions, or only docstrings")
+    parser.add_argument("--no-cache", action="store_true", help="Always regenerate, without reading or writing the cache")
+    return parser.parse_args()
+
+
+class PendingRequest:
+    """ Functions sent by one client, and the slot its outputs are delivered to. """
+
+    def __init__(self, functions, docstring_only=False):
+        self.functions = functions
+        self.docstring_only = docstring_only
+        self.outputs = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingWorker(threading.Thread):
+    """
+    Single thread that owns the model and serves queued requests in batches.
+
+    Requests arriving within max_wait of each other are merged into one call to
+    generate_functions, so concurrent clients share generate calls.
+    """
+
+    def __init__(self, backend, batch_size, max_wait, cache_dir=None, output_mode="function"):
+        super().__init__(daemon=True)
+        self.backend = backend
+        self.output_mode = output_mode
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.cache_dir = cache_dir
+        self.requests = queue.Queue()
+
+    def submit(self, functions, docstring_only=False):
+        """
+        Queue functions and block until they are commented.
+
+        :param functions: List of function source strings.
+        :param docstring_only: True if the client only keeps the docstrings (splice writer), which
+            allows condensed prompts and stopping at the end of the docstring.
+        """
+        request = PendingRequest(functions, docstring_only)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.outputs
+
+    def next_batch(self):
+        batch = [self.requests.get()]
+        size = len(batch[0].functions)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.functions)
+        return batch
+
+    def run(self):
+        # SQLite connections belong to the thread that opened them
+        cache = DocstringCache(self.cache_dir) if self.cache_dir else None
+        while True:
+            batch = self.next_batch()
+            # Whole functions and docstrings only are generated differently, so each kind gets its own call
+            for docstring_only in (True, False):
+                group = [request for request in batch if request.docstring_only == docstring_only]
+                if group:
+                    self.serve(group, cache, docstring_only)
+
+    def serve(self, batch, cache, docstring_only):
+        functions = [func for request in batch for func in request.functions]
+        try:
+            outputs = generate_functions(functions, self.batch_size, cache, self.backend, docstring_only, self.output_mode)
+        except Exception as e:
+            for request in batch:
+                request.error = str(e)
+                request.done.set()
+            return
+        offset = 0
+        for request in batch:
+            request.outputs = outputs[offset:offset + len(request.functions)]
+            offset += len(request.functions)
+            request.done.set()
+
+
+class CommentRequestHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON object per line: {"functions": [...], "writer": "splice" or "astor"} in,
+    {"outputs": [...], "output_mode": ...} or {"error": "..."} out. Requests without a writer
+    get whole functions, which are safe for both writers.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                docstring_only = request.get("writer") == "splice"
+                response = {"outputs": self.server.worker.submit(request["functions"], docstring_only),
+                            "output_mode": self.server.worker.output_mode}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+def remove_stale_socket(socket_path):
+    """
+    Remove a socket left behind by a server that is no longer running.
+
+    Refuses to touch anything that is not a socket, or a socket another server still listens on.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path) # Nobody is listening: left over from a server that exited without cleaning up
+            return
+    raise FileExistsError(f"Another server is already listening on {socket_path}")
+
+
+class CommentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, worker):
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, CommentRequestHandler)
+        self.worker = worker
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    remove_stale_socket(args.socket) # Fail before the slow model load if the socket is taken
+    backend = get_backend(args.backend, not args.no_prefix_cache, args.token_budget, **backend_options(args))
+    backend.load()
+    worker = BatchingWorker(backend, args.batch_size, args.max_wait_ms / 1000.0,
+                            None if args.no_cache else args.cache_dir, args.output_mode)
+    worker.start()
+    server = CommentServer(args.socket, worker)
+    print(f"Model loaded, listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        backend.close()
@@ -0,0 +1,247 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from token_rewriter import TokenRewriter, TRANSFORM_RULES
+from inference_backends import backends, get_backend, StubBackend
+import python_autocommenter
+import collect_dataset_strings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the AutoCommenter pipeline.")
+    parser.add_argument("--files", type=int, default=20, help="Number of files in the synthetic corpus")
+    parser.add_argument("--functions", type=int, default=40, help="Number of functions per file")
+    parser.add_argument("--nesting", type=int, default=2, help="Depth of nested blocks inside each function")
+    parser.add_argument("--docstring-density", type=float, default=0.5, help="Fraction of functions with a docstring")
+    parser.add_argument("--marker-density", type=float, default=0.3, help="Fraction of functions marked with #--")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best time is reported")
+    parser.add_argument("--jobs", type=int, default=None, help="Processes used by the end-to-end benchmark")
+    parser.add_argument("--out", type=str, default=None, help="Write the results as JSON to this file instead of stdout")
+    parser.add_argument("--sizes-mb", type=float, nargs="*", default=[0.5, 1, 2, 4], help="Source sizes used for the token rewriter scaling benchmark")
+    parser.add_argument("--ttft", action="store_true", help="Also benchmark time to first token with and without the prompt prefix cache (loads the model)")
+    parser.add_argument("--backend", choices=sorted(backends), default="unsloth", help="Backend used by --ttft")
+    parser.add_argument("--ttft-functions", type=int, default=16, help="Number of functions timed by --ttft")
+    parser.add_argument("--batch-size", type=int, default=1, help="Batch size used by --ttft")
+    return parser.parse_args()
+
+
+def synthetic_function(rng, index, nesting, docstring, marker):
+    """ Source of one synthetic function with nested blocks, comments and optionally a docstring or #-- marker. """
+    lines = [f"def function_{index}(a, b=1, *args, key=None):"]
+    if marker:
+        lines.append("    #--")
+    elif docstring:
+        lines.append(f'    """Docstring of function {index}.\n\n    :param a: First value.\n    """')
+    lines.append("    # accumulate the arguments")
+    lines.append(f"    total = a + b * {rng.randint(1, 100)}")
+    indent = "    "
+    for depth in range(nesting):
+        lines.append(f"{indent}for i_{depth} in range(a):")
+        indent += "    "
+        lines.append(f"{indent}if i_{depth} % {rng.randint(2, 9)}:")
+        indent += "    "
+        lines.append(f"{indent}total += i_{depth}  # inner comment")
+    lines.append("    return total")
+    return "\n".join(lines) + "\n\n"
+
+
+def generate_corpus(directory, files=20, functions=40, nesting=2, docstring_density=0.5, marker_density=0.3, seed=0):
+    """
+    Write a deterministic synthetic Python corpus.
+
+    :param directory: Directory the files are written to.
+    :param files: Number of files.
+    :param functions: Number of functions per file.
+    :param nesting: Depth of nested blocks inside each function.
+    :param docstring_density: Fraction of functions with a docstring.
+    :param marker_density: Fraction of functions marked with #--.
+    :param seed: Seed of the random generator.
+    :return: Sorted list of the written file paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for file_index in range(files):
+        parts = ["import os\nfrom collections import OrderedDict\n\n\n"]
+        for index in range(functions):
+            marker = rng.random() < marker_density
+            docstring = not marker and rng.random() < docstring_density
+            parts.append(synthetic_function(rng, index, nesting, docstring, marker))
+        filename = os.path.join(directory, f"module_{file_index:04d}.py")
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write("".join(parts))
+        filenames.append(filename)
+    return filenames
+
+
+def synthetic_module(target_bytes):
+    """ Build a module of documented, commented functions of roughly target_bytes. """
+    template = (
+        "def function_{i}(a, b=1):\n"
+        "    \"\"\"Docstring of function {i}.\"\"\"\n"
+        "    # add the arguments\n"
+        "    total = a + b * {i}\n"
+        "    return total\n\n"
+    )
+    parts = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        part = template.format(i=i)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def best_time(fn, repeat=3, setup=None):
+    """ Best wall time of fn over repeat runs; setup runs untimed before each one. """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_token_rewriter(sizes_mb):
+    """
+    Time a full rewrite plus marker capture for sources of increasing size.
+
+    :param sizes_mb: Source sizes in megabytes.
+    :return: List of dictionaries with the size, time and throughput of each run.
+    """
+    results = []
+    for size_mb in sizes_mb:
+        source = synthetic_module(int(size_mb * 1024 * 1024))
+        start = time.perf_counter()
+        TokenRewriter(TRANSFORM_RULES, capture_markers=True).feed(source).text()
+        elapsed = time.perf_counter() - start
+        results.append({'size_mb': size_mb, 'seconds': elapsed, 'mb_per_sec': size_mb / elapsed})
+    return results
+
+
+def bench_pipeline(filenames, workdir, repeat=3, jobs=None):
+    """
+    Time each stage of the pipeline over a synthetic corpus.
+
+    :param filenames: Files of the synthetic corpus.
+    :param workdir: Scratch directory for dataset outputs and the end-to-end copy.
+    :param repeat: Runs per benchmark.
+    :param jobs: Processes used by the end-to-end benchmark.
+    :return: Dictionary of benchmark name to seconds.
+    """
+    sources = []
+    for filename in filenames:
+        with open(filename, 'r', encoding='utf-8') as file:
+            sources.append(file.read())
+    comments = [python_autocommenter.capture_comments(source) for source in sources]
+    functions = [func for source in sources for func in collect_dataset_strings.extract_functions_from_file(source)[0]]
+
+    results = {}
+    results['capture_comments'] = best_time(
+        lambda: [python_autocommenter.capture_comments(source) for source in sources], repeat)
+    results['find_functions_with_comments'] = best_time(
+        lambda: [python_autocommenter.find_functions_with_comments(source, comment) for source, comment in zip(sources, comments)], repeat)
+    results['transform_function'] = best_time(
+        lambda: [collect_dataset_strings.transform_function(func) for func in functions], repeat)
+    results['extract_functions_from_file'] = best_time(
+        lambda: [collect_dataset_strings.extract_functions_from_file(source) for source in sources], repeat)
+
+    for extension in ("json", "jsonl"):
+        out_file = os.path.join(workdir, f"dataset.{extension}")
+
+        def reset(out_file=out_file):
+            for path in (out_file, out_file + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        results[f'append_to_json_{extension}'] = best_time(
+            lambda out_file=out_file: [collect_dataset_strings.append_to_json(filename, out_file) for filename in filenames], repeat, reset)
+
+    e2e_dir = os.path.join(workdir, "e2e")
+
+    def copy_corpus():
+        shutil.rmtree(e2e_dir, ignore_errors=True)
+        os.makedirs(e2e_dir)
+        for filename in filenames:
+            shutil.copy(filename, e2e_dir)
+
+    e2e_files = [os.path.join(e2e_dir, os.path.basename(filename)) for filename in filenames]
+    results['end_to_end_stub'] = best_time(
+        lambda: python_autocommenter.comment_files(e2e_files, jobs=jobs, backend=StubBackend()), repeat, copy_corpus)
+    return results
+
+
+def bench_prefix_cache(backend_name, num_functions=16, batch_size=1):
+    """
+    Time to first token (a generate call with one new token) with and without the prefix cache.
+
+    :param backend_name: Name of the inference backend to load.
+    :param num_functions: Number of synthetic functions to time.
+    :param batch_size: Functions per generate call.
+    :return: Dictionary of mode to mean seconds per function.
+    """
+    functions = [
+        f"def function_{i}(a, b=1):\n    #--\n    total = a + b * {i}\n    return total"
+        for i in range(num_functions)
+    ]
+    backend = get_backend(backend_name)
+    backend.load()
+    results = {}
+    for mode, use_prefix_cache in (("without_prefix_cache", False), ("with_prefix_cache", True)):
+        backend.use_prefix_cache = use_prefix_cache
+        backend.generate(functions[:batch_size], batch_size, [1] * batch_size) # Warm up, and build the prefix cache outside the timing
+        start = time.perf_counter()
+        backend.generate(functions, batch_size, [1] * len(functions))
+        results[mode] = (time.perf_counter() - start) / len(functions)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'corpus': {
+            'files': args.files, 'functions': args.functions, 'nesting': args.nesting,
+            'docstring_density': args.docstring_density, 'marker_density': args.marker_density, 'seed': args.seed,
+        },
+    }
+    workdir = tempfile.mkdtemp(prefix="autocommenter-bench-")
+    try:
+        filenames = generate_corpus(os.path.join(workdir, "corpus"), args.files, args.functions, args.nesting,
+                                    args.docstring_density, args.marker_density, args.seed)
+        report['seconds'] = bench_pipeline(filenames, workdir, args.repeat, args.jobs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report['token_rewriter'] = bench_token_rewriter(args.sizes_mb)
+    if args.ttft:
+        report['time_to_first_token'] = bench_prefix_cache(args.backend, args.ttft_functions, args.batch_size)
+
+    output = json.dumps(report, indent=4)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            file.write(output + "\n")
+    else:
+        print(output)
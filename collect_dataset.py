@@ -1,18 +1,21 @@
 import argparse
 import sys
-import token
-import os
-import tokenize
 import ast
-from io import StringIO
-import json
+from token_rewriter import TokenRewriter, TRANSFORM_RULES
+from dataset_io import append_jsonl, append_json_array, is_jsonl
+from corpus import collect_corpus
+from archive_sources import iter_source_records
+from dedup import Deduplicator
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Strip comments and docstrings from Python functions in a file.")
-    parser.add_argument("--filename", default="test_file.py", help="Python file to process")
-    parser.add_argument("--out_filename", default="datasets/dataset_strings.json", help="Json file output")
+    parser.add_argument("--filename", default="test_file.py", help="Python file, or .zip/.whl/.tar.gz archive of sources, to process")
+    parser.add_argument("--out_filename", default="datasets/dataset_strings.json", help="Json file output (.jsonl appends one record per line)")
     parser.add_argument("--in-place", action="store_true", help="Modify the file in-place")
+    parser.add_argument("--corpus", nargs="+", default=None, help="Directories, archives or .txt file lists to collect from in parallel instead of --filename")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of worker processes used with --corpus (default: CPU count)")
+    parser.add_argument("--dedup-index", default=None, help="SQLite index used to drop exact and near-duplicate functions across runs")
     return parser.parse_args()
 
 def do_file(functions, fname, in_place=False):
@@ -22,131 +25,85 @@ def do_file(functions, fname, in_place=False):
         nfname = fname[:-3] + '_modified.py'
     
     with open(nfname, "w", encoding='utf-8') as mod:
-        last_lineno = -1
-        last_col = 0
+        rewriter = TokenRewriter(TRANSFORM_RULES)
         for func in functions:
-            source = StringIO("\n" + func)
-            tokgen = tokenize.generate_tokens(source.readline)
-            prev_toktype = tokenize.INDENT
-            for toktype, ttext, (slineno, scol), (elineno, ecol), ltext in tokgen:
-                if 0:   # Change to if 1 to see the tokens fly by.
-                    print("%10s %-14s %-20r %r" % (
-                        tokenize.tok_name.get(toktype, toktype),
-                        "%d.%d-%d.%d" % (slineno, scol, elineno, ecol),
-                        ttext, ltext
-                        ))
-                if slineno > last_lineno:
-                    last_col = 0
-                if scol > last_col:
-                    mod.write(" " * (scol - last_col))
-                if toktype == token.STRING and prev_toktype == token.INDENT:
-                    # Docstring
-                    mod.write("#--")
-                elif toktype == tokenize.COMMENT:
-                    # Comment
-                    mod.write("##\n")
-                else:
-                    mod.write(ttext)
-                prev_toktype = toktype
-                last_col = ecol
-                last_lineno = elineno
+            mod.write(rewriter.feed("\n" + func).drain())
 
     return nfname
 
 
 def transform_function(func_code):
-    """ Simulate a transformation of function code, could be adding comments, etc. """
-    # Example transformation: Just appending a comment about processing
-    source = StringIO(func_code)
-    tokgen = tokenize.generate_tokens(source.readline)
-    prev_toktype = tokenize.INDENT  
-    code_string = ""
-    last_lineno = -1
-    last_col = 0
-    for toktype, ttext, (slineno, scol), (elineno, ecol), ltext in tokgen:
-        if 0:   # Change to if 1 to see the tokens fly by.
-            print("%10s %-14s %-20r %r" % (
-                tokenize.tok_name.get(toktype, toktype),
-                "%d.%d-%d.%d" % (slineno, scol, elineno, ecol),
-                ttext, ltext
-                ))
-        if slineno > last_lineno:
-            last_col = 0
-        if scol > last_col:
-           code_string += " " * (scol - last_col)
-        if toktype == token.STRING and prev_toktype == token.INDENT:
-            # Docstring
-            code_string += "#--"
-        elif toktype == tokenize.COMMENT:
-            # Comment
-            code_string += "##\n"
-        else:
-            code_string += ttext
-        prev_toktype = toktype
-        last_col = ecol
-        last_lineno = elineno
-
-    return code_string
-
-def append_to_json(input_file, json_file):
-    """ Append new functions extracted from input_file to json_file. """
-
-    with open(input_file, 'r', encoding='utf-8') as file:
-        source_code = file.read()
-
-    functions, imports = extract_functions_from_file(source_code)
-    existing_data, last_index = load_existing_data(json_file)
-    new_data = []
-    imports_string = "\n".join(imports)
-    
-    for idx, func in enumerate(functions, start=last_index + 1):
-        item = {
-            'id': idx,
+    """ Replace the docstring of func_code with #-- and its comments with ##, in a single token pass. """
+    return TokenRewriter(TRANSFORM_RULES).feed(func_code).text()
+
+def records_from_source(source_code):
+    """ Yield the dataset records (without ids) for every function in source_code, one at a time. """
+    root = ast.parse(source_code)
+    imports_string = "\n".join(iter_imports(root)) # Every record carries the imports, so they are gathered first
+    for func in iter_functions(root):
+        yield {
             'input': func,
             'output': transform_function(func),
             'imports': imports_string
         }
-        new_data.append(item)
-    
-    # Combine old and new data
-    combined_data = existing_data + new_data
 
-    with open(json_file, 'w', encoding='utf-8') as file:
-        json.dump(combined_data, file, indent=4)
+def append_to_json(input_file, json_file, dedup=None):
+    """
+    Append new functions extracted from input_file to json_file, skipping duplicates if dedup is given.
 
-    print(f"Appended {len(functions)} functions to {json_file}")
+    input_file may also be a .zip, .whl or .tar.gz archive, whose .py members are read without extracting it.
+    """
+    errors = []
+    records = iter_source_records(input_file, records_from_source, errors)
+    if dedup is not None:
+        records = dedup.filter(records)
 
-def load_existing_data(file_path):
-    """ Load existing data from a JSON file and find the highest index used. """
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        if data:  # Check if the data is not empty
-            last_index = max(item['id'] for item in data)  # Find the maximum id used so far
-            return data, last_index
-    return [], 0  # Return empty list and start index 0 if file does not exist
+    if is_jsonl(json_file):
+        # Streaming format: only the new records are written
+        count = append_jsonl(records, json_file)
+    else:
+        # Records are written one at a time after the existing items, which are streamed too
+        count = append_json_array(records, json_file, assign_ids=True)
+    report_skipped(errors)
+    print(f"Appended {count} functions to {json_file}")
 
+def report_skipped(errors):
+    for label, error in errors:
+        print(f"Skipped {label}: {error}", file=sys.stderr)
 
+def iter_functions(root):
+    """ Yield the source of every function of a parsed module, one at a time. """
+    for node in ast.walk(root):
+        if isinstance(node, (ast.FunctionDef)):
+            yield ast.unparse(node)
+
+def iter_imports(root):
+    """ Yield the source of every import statement of a parsed module. """
+    for node in ast.walk(root):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield ast.unparse(node)
+
+def iter_functions_from_file(code):
+    """ Yield the source of every function in code, one at a time. """
+    return iter_functions(ast.parse(code))
 
 def extract_functions_from_file(code):
+    """ List version of iter_functions_from_file, also returning the imports. """
     root = ast.parse(code)
-    items = []
-    imports = []
-    for node in ast.walk(root):
-        if isinstance(node, (ast.FunctionDef)):
-            #print(ast.get_docstring(node))
-            item_code = ast.unparse(node)
-            items.append(item_code)
-        elif isinstance(node, (ast.Import, ast.ImportFrom)):
-            import_code = ast.unparse(node)
-            imports.append(import_code)
-    return items, imports
+    return list(iter_functions(root)), list(iter_imports(root))
 
 if __name__ == '__main__':
     args = parse_args()
     try:
-
-        append_to_json(args.filename, args.out_filename)
+        # The dedup key is the transform_function output, i.e. the text the model is trained on
+        dedup = Deduplicator(args.dedup_index, field='output') if args.dedup_index else None
+        if args.corpus:
+            collect_corpus(args.corpus, args.out_filename, records_from_source, args.jobs, dedup=dedup)
+        else:
+            append_to_json(args.filename, args.out_filename, dedup)
+        if dedup is not None:
+            print(dedup.stats())
+            dedup.close()
         print(f"Processed file saved as: {args.out_filename}")
     except Exception as e:
         print(f"Error processing the file: {e}")
\ No newline at end of file
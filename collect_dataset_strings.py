@@ -1,18 +1,25 @@
 import argparse
 import sys
-import token
 import os
-import tokenize
 import ast
-from io import StringIO
-import json
+from token_rewriter import TokenRewriter, TRANSFORM_RULES
+from dataset_io import append_jsonl, append_json_array, is_jsonl, iter_records
+from corpus import collect_corpus
+from archive_sources import iter_source_records
+from functools import partial
+from inference_backends import instruction_prompts
+from dedup import Deduplicator
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Strip comments and docstrings from Python functions in a file.")
-    parser.add_argument("--filename", default="test_file.py", help="Python file to process")
-    parser.add_argument("--out_filename", default="datasets/dataset_strings.json", help="Json file output")
+    parser.add_argument("--filename", default="test_file.py", help="Python file, or .zip/.whl/.tar.gz archive of sources, to process")
+    parser.add_argument("--out_filename", default="datasets/dataset_strings.json", help="Json file output (.jsonl appends one record per line)")
     parser.add_argument("--in-place", action="store_true", help="Modify the file in-place")
+    parser.add_argument("--output-mode", choices=["docstring", "function"], default="docstring", help="Train the model to emit only the docstring, or the whole commented function")
+    parser.add_argument("--corpus", nargs="+", default=None, help="Directories, archives or .txt file lists to collect from in parallel instead of --filename")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of worker processes used with --corpus (default: CPU count)")
+    parser.add_argument("--dedup-index", default=None, help="SQLite index used to drop exact and near-duplicate functions across runs")
     return parser.parse_args()
 
 def do_file(functions, fname, in_place=False):
@@ -22,131 +29,127 @@ def do_file(functions, fname, in_place=False):
         nfname = fname[:-3] + '_modified.py'
     
     with open(nfname, "w", encoding='utf-8') as mod:
-        last_lineno = -1
-        last_col = 0
+        rewriter = TokenRewriter(TRANSFORM_RULES)
         for func in functions:
-            source = StringIO("\n" + func)
-            tokgen = tokenize.generate_tokens(source.readline)
-            prev_toktype = tokenize.INDENT
-            for toktype, ttext, (slineno, scol), (elineno, ecol), ltext in tokgen:
-                if 0:   # Change to if 1 to see the tokens fly by.
-                    print("%10s %-14s %-20r %r" % (
-                        tokenize.tok_name.get(toktype, toktype),
-                        "%d.%d-%d.%d" % (slineno, scol, elineno, ecol),
-                        ttext, ltext
-                        ))
-                if slineno > last_lineno:
-                    last_col = 0
-                if scol > last_col:
-                    mod.write(" " * (scol - last_col))
-                if toktype == token.STRING and prev_toktype == token.INDENT:
-                    # Docstring
-                    mod.write("#--")
-                elif toktype == tokenize.COMMENT:
-                    # Comment
-                    mod.write("##\n")
-                else:
-                    mod.write(ttext)
-                prev_toktype = toktype
-                last_col = ecol
-                last_lineno = elineno
+            mod.write(rewriter.feed("\n" + func).drain())
 
     return nfname
 
 
 def transform_function(func_code):
-    """ Simulate a transformation of function code, could be adding comments, etc. """
-    # Example transformation: Just appending a comment about processing
-    source = StringIO(func_code)
-    tokgen = tokenize.generate_tokens(source.readline)
-    prev_toktype = tokenize.INDENT  
-    code_string = ""
-    last_lineno = -1
-    last_col = 0
-    for toktype, ttext, (slineno, scol), (elineno, ecol), ltext in tokgen:
-        if 0:   # Change to if 1 to see the tokens fly by.
-            print("%10s %-14s %-20r %r" % (
-                tokenize.tok_name.get(toktype, toktype),
-                "%d.%d-%d.%d" % (slineno, scol, elineno, ecol),
-                ttext, ltext
-                ))
-        if slineno > last_lineno:
-            last_col = 0
-        if scol > last_col:
-           code_string += " " * (scol - last_col)
-        if toktype == token.STRING and prev_toktype == token.INDENT:
-            # Docstring
-            code_string += "#--"
-        elif toktype == tokenize.COMMENT:
-            # Comment
-            code_string += "##\n"
-        else:
-            code_string += ttext
-        prev_toktype = toktype
-        last_col = ecol
-        last_lineno = elineno
-
-    return code_string
-
-def append_to_json(input_file, json_file):
-    """ Append new functions extracted from input_file to json_file. """
-
-    with open(input_file, 'r', encoding='utf-8') as file:
-        source_code = file.read()
-
-    functions, imports, doc_strings = extract_functions_from_file(source_code)
-    existing_data, index = load_existing_data(json_file)
-    new_data = []
-    imports_string = "\n".join(imports)
-    for i in range(len(functions)):
-        item = {
-            'instruction': "Write detailed and informative comments for the Python function provided. The comments should include a high-level overview of the function's purpose, detailed descriptions of each parameter and what they represent, an explanation of the function's return values, and a line-by-line breakdown of what each part of the code does. The goal is to make the function's operation clear and understandable for someone who may be unfamiliar with the code.",
-            'input': transform_function(functions[i]),
-            'output': doc_strings[i],
+    """ Replace the docstring of func_code with #-- and its comments with ##, in a single token pass. """
+    return TokenRewriter(TRANSFORM_RULES).feed(func_code).text()
+
+def records_from_source(source_code, output_mode="docstring"):
+    """
+    Yield the dataset record of every documented function in source_code, one at a time.
+
+    In "docstring" mode the output is the docstring text alone, matching
+    python_autocommenter.py --output-mode docstring; in "function" mode it is the whole
+    documented function.
+    """
+    for function, doc_string in iter_functions_from_file(source_code):
+        yield {
+            'instruction': instruction_prompts[output_mode],
+            'input': transform_function(function),
+            'output': doc_string if output_mode == "docstring" else function,
         }
-        new_data.append(item)
-        
-    # Combine old and new data
-    combined_data = existing_data + new_data
-    
 
-    with open(json_file, 'w', encoding='utf-8') as file:
-        json.dump(combined_data, file, indent=4)
+def append_to_json(input_file, json_file, dedup=None, output_mode="docstring"):
+    """
+    Append new functions extracted from input_file to json_file, skipping duplicates if dedup is given.
 
-    print(f"Appended {len(functions)} functions to {json_file}")
+    input_file may also be a .zip, .whl or .tar.gz archive, whose .py members are read without extracting it.
+    """
+    errors = []
+    new_data = iter_source_records(input_file, partial(records_from_source, output_mode=output_mode), errors)
+    if dedup is not None:
+        new_data = dedup.filter(new_data)
 
-def load_existing_data(file_path):
-    """ Load existing data from a JSON file and find the highest index used. """
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            return data, 0
-    return [], 0  # Return empty list and start index 0 if file does not exist
+    if is_jsonl(json_file):
+        # Streaming format: only the new records are written, ids come from the sidecar index
+        count = append_jsonl(new_data, json_file)
+    else:
+        # Records are written one at a time after the existing items, which are streamed too
+        count = append_json_array(new_data, json_file, assign_ids=True)
+    report_skipped(errors)
+    print(f"Appended {count} functions to {json_file}")
+
+def record_format(record):
+    """ Output mode a record was collected with, or None for records of another format (e.g. before --output-mode existed). """
+    is_function = record.get('output', '').lstrip().startswith(("def ", "async def ", "@"))
+    for output_mode, instruction in instruction_prompts.items():
+        if record.get('instruction') == instruction and is_function == (output_mode == "function"):
+            return output_mode
+    return None
+
+def check_format(json_file, output_mode):
+    """
+    Refuse to append to a dataset whose records were collected in another format.
+
+    Only the first record is read. Mixing instructions or output kinds in one dataset would
+    train the model on two output formats at once.
+    """
+    if not os.path.exists(json_file) or os.path.getsize(json_file) == 0:
+        return
+    for record in iter_records(json_file):
+        found = record_format(record)
+        if found is None and record.get('instruction') == instruction_prompts["function"]:
+            # The collector used to pair the whole-function instruction with docstring outputs
+            raise ValueError(f"{json_file} was collected before --output-mode existed: its docstring outputs carry the "
+                             f"instruction for whole functions, which matches neither mode. Migrate it to the docstring "
+                             f"format with: python rename_json_keys.py {json_file} "
+                             f"--set \"instruction={instruction_prompts['docstring']}\"")
+        if found != output_mode:
+            raise ValueError(f"{json_file} holds records in another format than --output-mode {output_mode}; "
+                             f"collect into a new file or pass the matching --output-mode")
+        return
+
+def report_skipped(errors):
+    for label, error in errors:
+        print(f"Skipped {label}: {error}", file=sys.stderr)
+
+def iter_functions(root):
+    """ Yield (function source, docstring) for every documented function of a parsed module, one at a time. """
+    for node in ast.walk(root):
+        if isinstance(node, (ast.FunctionDef)):
+            doc_string = ast.get_docstring(node)
+            if doc_string:
+                yield ast.unparse(node), doc_string
 
+def iter_imports(root):
+    """ Yield the source of every import statement of a parsed module. """
+    for node in ast.walk(root):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield ast.unparse(node)
 
+def iter_functions_from_file(code):
+    """ Yield (function source, docstring) for every documented function in code, one at a time. """
+    return iter_functions(ast.parse(code))
 
 def extract_functions_from_file(code):
+    """ List version of iter_functions_from_file: (functions, imports, docstrings). """
     root = ast.parse(code)
     items = []
-    imports = []
     doc_strings = []
-    for node in ast.walk(root):
-        if isinstance(node, (ast.FunctionDef)):
-            if ast.get_docstring(node):
-            #print(ast.get_docstring(node))
-                item_code = ast.unparse(node)
-                items.append(item_code)
-                doc_strings.append(ast.get_docstring(node))
-        elif isinstance(node, (ast.Import, ast.ImportFrom)):
-            import_code = ast.unparse(node)
-            imports.append(import_code)
-    return items, imports, doc_strings
+    for item_code, doc_string in iter_functions(root):
+        items.append(item_code)
+        doc_strings.append(doc_string)
+    return items, list(iter_imports(root)), doc_strings
 
 if __name__ == '__main__':
     args = parse_args()
     try:
-
-        append_to_json(args.filename, args.out_filename)
+        check_format(args.out_filename, args.output_mode)
+        # The dedup key is the transform_function output, i.e. the text the model is trained on
+        dedup = Deduplicator(args.dedup_index, field='input') if args.dedup_index else None
+        if args.corpus:
+            collect_corpus(args.corpus, args.out_filename, partial(records_from_source, output_mode=args.output_mode), args.jobs, dedup=dedup)
+        else:
+            append_to_json(args.filename, args.out_filename, dedup, args.output_mode)
+        if dedup is not None:
+            print(dedup.stats())
+            dedup.close()
         print(f"Processed file saved as: {args.out_filename}")
     except Exception as e:
         print(f"Error processing the file: {e}")
\ No newline at end of file
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataset_io import append_jsonl, append_json_array, is_jsonl, iter_jsonl
+from archive_sources import is_archive, iter_source_records
+
+
+def find_source_files(paths):
+    """
+    Expand directories and file lists into a sorted list of Python files and source archives.
+
+    :param paths: Directories, Python files, archives (.zip, .whl, .tar.gz...), or .txt files
+        listing one path per line.
+    :return: Sorted list of unique Python file and archive paths.
+    """
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__pycache__']
+                filenames.update(os.path.join(root, f) for f in files if f.endswith('.py') or is_archive(f))
+        elif path.endswith('.txt'):
+            with open(path, 'r', encoding='utf-8') as file:
+                filenames.update(line.strip() for line in file if line.strip())
+        else:
+            filenames.add(path)
+    return sorted(filenames)
+
+
+def process_chunk(shard_file, filenames, records_fn):
+    """
+    Extract the records of a chunk of files into one shard, in file order.
+
+    Runs in a worker process. Files and archive members that cannot be read or parsed are
+    skipped; archives are streamed member by member without extracting them.
+    :param shard_file: JSONL file the records of this chunk are written to.
+    :param filenames: Python files and archives handled by this worker.
+    :param records_fn: Function turning source code into an iterable of records.
+    :return: Tuple of (shard file, number of records, list of (filename or member, error)).
+    """
+    count = 0
+    errors = []
+    with open(shard_file, 'w', encoding='utf-8') as shard:
+        for filename in filenames:
+            try:
+                for record in iter_source_records(filename, records_fn, errors):
+                    shard.write(json.dumps(record) + '\n')
+                    count += 1
+            except Exception as e:
+                errors.append((filename, str(e)))
+    return shard_file, count, errors
+
+
+def iter_shards(shard_files, dedup=None):
+    """ Yield the records of all shards in order, dropping duplicates if a Deduplicator is given. """
+    for shard_file in shard_files:
+        records = iter_jsonl(shard_file)
+        yield from (dedup.filter(records) if dedup is not None else records)
+
+
+def merge_shards(shard_files, out_file, dedup=None):
+    """
+    Merge shards into out_file, giving records globally unique ids in shard order.
+
+    Shards are merged in the order of the sorted file list, so ids do not depend on
+    which worker finished first.
+    """
+    if is_jsonl(out_file):
+        return append_jsonl(iter_shards(shard_files, dedup), out_file)
+
+    # Existing items and new records are streamed into the new file, never loaded whole
+    return append_json_array(iter_shards(shard_files, dedup), out_file, assign_ids=True)
+
+
+def collect_corpus(paths, out_file, records_fn, jobs=None, chunk_size=64, dedup=None):
+    """
+    Build dataset records from many source files with a process pool.
+
+    :param paths: Directories, Python files, archives or .txt file lists to collect from.
+    :param out_file: Dataset file (.json or .jsonl) the records are added to.
+    :param records_fn: Module-level function turning source code into an iterable of records.
+    :param jobs: Number of worker processes (default: CPU count).
+    :param chunk_size: Number of files handled per shard.
+    :param dedup: Deduplicator applied while merging, or None to keep every record.
+    :return: Number of records added.
+    """
+    start = time.perf_counter()
+    filenames = find_source_files(paths)
+    chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+    shard_dir = out_file + '.shards'
+    os.makedirs(shard_dir, exist_ok=True)
+    shard_files = [os.path.join(shard_dir, f"shard-{i:05d}.jsonl") for i in range(len(chunks))]
+
+    skipped = 0
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(process_chunk, shard_files, chunks, [records_fn] * len(chunks))
+            for _, _, errors in results:
+                for filename, error in errors:
+                    print(f"Skipped {filename}: {error}", file=sys.stderr)
+                skipped += len(errors)
+        count = merge_shards(shard_files, out_file, dedup)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    rate = len(filenames) / elapsed if elapsed > 0 else 0.0
+    print(f"Collected {count} functions from {len(filenames)} files and archives ({skipped} files or members skipped) "
+          f"in {elapsed:.1f}s, {rate:.1f} files/sec")
+    return count
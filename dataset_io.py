@@ -0,0 +1,232 @@
+import argparse
+import itertools
+import json
+import os
+import textwrap
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert datasets between the JSON array and JSONL formats.")
+    parser.add_argument("command", choices=["to-jsonl", "to-json"], help="Direction of the conversion")
+    parser.add_argument("input_file", help="Dataset file to read")
+    parser.add_argument("output_file", help="Dataset file to write")
+    return parser.parse_args()
+
+
+def is_jsonl(file_path):
+    return file_path.endswith('.jsonl')
+
+
+def index_path(jsonl_file):
+    """ Path of the sidecar index that stores the next id and the record count of a JSONL dataset. """
+    return jsonl_file + '.idx'
+
+
+def iter_jsonl(jsonl_file):
+    """ Yield the records of a JSONL dataset one at a time. """
+    with open(jsonl_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(json_file, chunk_size=1 << 20):
+    """
+    Yield the items of a JSON array file one at a time, reading it in chunks.
+
+    Memory use is bounded by chunk_size plus the largest single item, not the file size.
+    :param json_file: Path of a file holding one JSON array.
+    :param chunk_size: Characters read per refill.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r', encoding='utf-8') as file:
+        buffer, pos, eof = "", 0, False
+
+        def fill(buffer, pos):
+            """ Drop the consumed part of the buffer and read the next chunk. """
+            more = file.read(chunk_size)
+            return buffer[pos:] + more, 0, not more
+
+        def skip_whitespace(buffer, pos, eof):
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer, pos, eof
+                buffer, pos, eof = fill(buffer, pos)
+
+        buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError(f"{json_file} does not hold a JSON array")
+        pos += 1
+        first = True
+        while True:
+            buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+            if buffer[pos:pos + 1] == ']':
+                return
+            if not first:
+                if buffer[pos:pos + 1] != ',':
+                    raise ValueError(f"Expected ',' or ']' at character {pos} of the current chunk of {json_file}")
+                buffer, pos, eof = skip_whitespace(buffer, pos + 1, eof)
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # A number cut by the chunk end decodes as a shorter number ("-3." as -3), so a
+                    # value only counts once the separator that must follow it has been read
+                    if eof or (end < len(buffer) and buffer[end] in " \t\r\n,]"):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                buffer, pos, eof = fill(buffer, pos)
+            pos = end
+            first = False
+            yield item
+
+
+def iter_records(dataset_file):
+    """ Yield the records of a JSON array or JSONL dataset one at a time. """
+    if is_jsonl(dataset_file):
+        return iter_jsonl(dataset_file)
+    return iter_json_array(dataset_file)
+
+
+def write_json_array(records, file):
+    """
+    Write records to an open file as an indented JSON array, one record at a time.
+
+    :return: Number of records written.
+    """
+    count = 0
+    file.write('[')
+    for item in records:
+        file.write(',\n' if count else '\n')
+        file.write(textwrap.indent(json.dumps(item, indent=4), '    '))
+        count += 1
+    file.write('\n]' if count else ']')
+    return count
+
+
+def append_json_array(records, json_file, assign_ids=False):
+    """
+    Append records to a JSON array dataset without loading it.
+
+    The existing items and the new records are streamed into a temporary file that then
+    replaces json_file, so memory use is bounded by the largest record.
+    :param records: Iterable of dictionaries.
+    :param json_file: Path of the JSON array dataset; created if missing.
+    :param assign_ids: Give each new record the next id after the highest existing one.
+    :return: Number of records appended.
+    """
+    exists = os.path.exists(json_file)
+    next_id = 1
+    if assign_ids and exists:
+        next_id = max((item.get('id', 0) for item in iter_json_array(json_file)), default=0) + 1
+    count = 0
+
+    def new_items():
+        nonlocal count
+        for record in records:
+            if assign_ids:
+                item = {'id': next_id + count}
+                item.update(record)
+                record = item
+            count += 1
+            yield record
+
+    tmp_file = json_file + '.tmp'
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            write_json_array(itertools.chain(iter_json_array(json_file) if exists else (), new_items()), file)
+        os.replace(tmp_file, json_file)
+    except BaseException:
+        os.unlink(tmp_file)
+        raise
+    return count
+
+
+def read_index(jsonl_file):
+    """
+    Read the sidecar index of a JSONL dataset.
+
+    If the index is missing (e.g. the dataset was copied without it), it is rebuilt
+    with a single streaming pass over the records.
+    :param jsonl_file: Path of the JSONL dataset.
+    :return: Dictionary with 'next_id' and 'count'.
+    """
+    idx_file = index_path(jsonl_file)
+    if os.path.exists(idx_file):
+        with open(idx_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    index = {'next_id': 1, 'count': 0}
+    if os.path.exists(jsonl_file):
+        for item in iter_jsonl(jsonl_file):
+            index['count'] += 1
+            if 'id' in item:
+                index['next_id'] = max(index['next_id'], item['id'] + 1)
+    return index
+
+
+def write_index(jsonl_file, index):
+    idx_file = index_path(jsonl_file)
+    tmp_file = idx_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    os.replace(tmp_file, idx_file)
+
+
+def append_jsonl(records, jsonl_file):
+    """
+    Append records to a JSONL dataset, giving each one the next free id.
+
+    Only the new records are written, so the cost does not depend on the size of the dataset.
+    :param records: Iterable of dictionaries without an 'id'.
+    :param jsonl_file: Path of the JSONL dataset.
+    :return: Number of records appended.
+    """
+    index = read_index(jsonl_file)
+    count = 0
+    try:
+        with open(jsonl_file, 'a', encoding='utf-8') as file:
+            for record in records:
+                item = {'id': index['next_id'] + count}
+                item.update(record)
+                file.write(json.dumps(item) + '\n')
+                count += 1
+    finally:
+        # Also when records raises midway: the lines already written keep their ids
+        index['next_id'] += count
+        index['count'] += count
+        write_index(jsonl_file, index)
+    return count
+
+
+def json_to_jsonl(json_file, jsonl_file):
+    """ Convert a JSON array dataset into a JSONL dataset and its sidecar index. """
+    index = {'next_id': 1, 'count': 0}
+    with open(jsonl_file, 'w', encoding='utf-8') as file:
+        for item in iter_json_array(json_file):
+            file.write(json.dumps(item) + '\n')
+            index['count'] += 1
+            if 'id' in item:
+                index['next_id'] = max(index['next_id'], item['id'] + 1)
+    write_index(jsonl_file, index)
+    return index['count']
+
+
+def jsonl_to_json(jsonl_file, json_file):
+    """ Convert a JSONL dataset back into the JSON array format. """
+    with open(json_file, 'w', encoding='utf-8') as file:
+        return write_json_array(iter_jsonl(jsonl_file), file)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        if args.command == "to-jsonl":
+            count = json_to_jsonl(args.input_file, args.output_file)
+        else:
+            count = jsonl_to_json(args.input_file, args.output_file)
+        print(f"Converted {count} records to {args.output_file}")
+    except Exception as e:
+        print(f"Error converting the file: {e}")
@@ -0,0 +1,132 @@
+import hashlib
+import random
+import re
+import sqlite3
+from array import array
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def normalize_text(text):
+    """ Collapse all whitespace so that formatting differences do not hide duplicates. """
+    return " ".join(text.split())
+
+
+def shingles(text, k=5):
+    """ Return the set of k-token shingles of text, hashed to 64-bit integers. """
+    tokens = _TOKEN_RE.findall(text)
+    if len(tokens) < k:
+        tokens = tokens + [""] * (k - len(tokens))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(tokens[i:i + k]).encode('utf-8'), digest_size=8).digest(), 'little')
+        for i in range(len(tokens) - k + 1)
+    }
+
+
+class MinHasher:
+    """ MinHash signatures with a fixed seed, so signatures are comparable across runs. """
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text):
+        hashes = shingles(text)
+        return array('Q', (min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params))
+
+
+def signature_similarity(sig_a, sig_b):
+    """ Estimated Jaccard similarity of two MinHash signatures. """
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class Deduplicator:
+    """
+    Two-tier duplicate filter for dataset records, backed by an on-disk index.
+
+    The first tier drops records whose normalized text was already seen (exact hash).
+    The second tier drops records whose MinHash signature collides with a stored one in
+    an LSH band and whose estimated similarity reaches the threshold. The index lives in
+    SQLite, so memory stays bounded and later runs keep deduplicating against earlier shards.
+    """
+
+    def __init__(self, index_file, field='input', threshold=0.8, num_perm=64, bands=16):
+        """
+        Open (or create) the index.
+        :param index_file: SQLite file holding the hashes, signatures and LSH buckets.
+        :param field: Record key whose text is compared.
+        :param threshold: Estimated Jaccard similarity at which a record counts as a near duplicate.
+        :param num_perm: Number of MinHash permutations.
+        :param bands: Number of LSH bands; num_perm must be a multiple of it.
+        """
+        self.field = field
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.exact_removed = 0
+        self.near_removed = 0
+        self.kept = 0
+        self.connection = sqlite3.connect(index_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS exact (hash BLOB PRIMARY KEY)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS signatures (id INTEGER PRIMARY KEY, signature BLOB NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS buckets (bucket BLOB NOT NULL, signature_id INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket)")
+
+    def _band_keys(self, signature):
+        return [
+            hashlib.blake2b(bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=12).digest()
+            for band in range(self.bands)
+        ]
+
+    def check(self, record):
+        """
+        Classify a record and add it to the index if it is new.
+
+        :param record: Dataset record containing self.field.
+        :return: 'exact' or 'near' for duplicates, None for records to keep.
+        """
+        text = normalize_text(record[self.field])
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        if self.connection.execute("SELECT 1 FROM exact WHERE hash = ?", (digest,)).fetchone():
+            self.exact_removed += 1
+            return 'exact'
+        self.connection.execute("INSERT INTO exact (hash) VALUES (?)", (digest,))
+
+        signature = self.hasher.signature(text)
+        band_keys = self._band_keys(signature)
+        seen = set()
+        for key in band_keys:
+            for signature_id, stored in self.connection.execute(
+                    "SELECT s.id, s.signature FROM buckets b JOIN signatures s ON s.id = b.signature_id WHERE b.bucket = ?", (key,)):
+                if signature_id in seen:
+                    continue
+                seen.add(signature_id)
+                if signature_similarity(signature, array('Q', stored)) >= self.threshold:
+                    self.near_removed += 1
+                    return 'near'
+
+        cursor = self.connection.execute("INSERT INTO signatures (signature) VALUES (?)", (signature.tobytes(),))
+        self.connection.executemany("INSERT INTO buckets (bucket, signature_id) VALUES (?, ?)",
+                                    [(key, cursor.lastrowid) for key in band_keys])
+        self.kept += 1
+        return None
+
+    def filter(self, records):
+        """ Yield only the records that are neither exact nor near duplicates. """
+        for count, record in enumerate(records, start=1):
+            if self.check(record) is None:
+                yield record
+            if count % 1000 == 0:
+                self.connection.commit()
+        self.connection.commit()
+
+    def stats(self):
+        return (f"Dedup: kept {self.kept}, removed {self.exact_removed} exact "
+                f"and {self.near_removed} near duplicates")
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def normalize_function_source(function_source):
+    """ Normalize function source so that whitespace-only differences hash the same. """
+    lines = [line.rstrip() for line in function_source.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(function_source, model_identity, generation_params):
+    """
+    Build the content address of a generated function.
+
+    :param function_source: Function source as returned by find_functions_with_comments.
+    :param model_identity: String identifying the model and adapter weights.
+    :param generation_params: Dictionary of parameters that change the generated output.
+    :return: Hex digest used as the cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_identity.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(json.dumps(generation_params, sort_keys=True).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(normalize_function_source(function_source).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class DocstringCache:
+    """
+    Persistent on-disk cache of model outputs with size-bounded LRU eviction.
+
+    Writes are grouped into one transaction until commit() or close(), so a run costs one
+    sync instead of one per function.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        """
+        Open (or create) the cache.
+        :param cache_dir: Directory holding the cache database.
+        :param max_bytes: Total size of cached outputs kept before the least recently used are evicted.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "docstrings.sqlite3"))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.connection.commit()
+        self.total_bytes = self._stored_bytes() # Kept up to date by put, so inserts never scan the table
+
+    def get(self, key):
+        """ Return the cached output for key, or None on a miss. """
+        row = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, value):
+        """ Store an output and evict the least recently used entries if the cache is over its size. """
+        size = len(value.encode('utf-8'))
+        old = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time()),
+        )
+        self.total_bytes += size - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def _stored_bytes(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """ Delete least recently used entries until the total size fits in max_bytes. """
+        total = self._stored_bytes() # Recount, in case another process wrote to the cache since it was opened
+        if total <= self.max_bytes:
+            self.total_bytes = total
+            return
+        rows = self.connection.execute("SELECT key, size FROM entries ORDER BY last_used ASC")
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self.total_bytes = total
+
+    def stats(self):
+        """ Return a one-line hit/miss report. """
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return f"Docstring cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def commit(self):
+        """ Write the pending lookups and insertions to disk. """
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,135 @@
+import ast
+
+# Dunder method -> (summary, return description)
+_DUNDER_DOCSTRINGS = {
+    "__repr__": ("Return the developer representation of the object.", "Representation of the object."),
+    "__str__": ("Return the string representation of the object.", "String form of the object."),
+    "__len__": ("Return the number of items in the object.", "Number of items."),
+    "__hash__": ("Return the hash of the object.", "Hash of the object."),
+    "__bool__": ("Return whether the object is truthy.", "True if the object is truthy."),
+    "__iter__": ("Return an iterator over the object.", "Iterator over the object."),
+    "__enter__": ("Enter the context and return the object.", "The object."),
+}
+
+
+def _params(node):
+    """ Parameter names of a function in signature order, without self and cls. """
+    args = node.args
+    signature = args.posonlyargs + args.args + [args.vararg] + args.kwonlyargs + [args.kwarg]
+    names = [arg.arg for arg in signature if arg is not None]
+    return [name for name in names if name not in ("self", "cls")]
+
+
+def _body(node):
+    """ Statements of a function body, without its docstring. """
+    body = node.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+        body = body[1:]
+    return body
+
+
+def _self_attribute(expr):
+    """ Name of the attribute if expr is self.<name> (or cls.<name>), else None. """
+    if isinstance(expr, ast.Attribute) and isinstance(expr.value, ast.Name) and expr.value.id in ("self", "cls"):
+        return expr.attr
+    return None
+
+
+def _words(name):
+    return name.strip("_").replace("_", " ") or name
+
+
+def _is_property(node):
+    return any(isinstance(decorator, ast.Name) and decorator.id == "property" for decorator in node.decorator_list)
+
+
+def _passes_through(call, params):
+    """ True if call forwards exactly the function's parameters, in order. """
+    forwarded = []
+    for arg in call.args:
+        value = arg.value if isinstance(arg, ast.Starred) else arg
+        if not isinstance(value, ast.Name):
+            return False
+        forwarded.append(value.id)
+    for keyword in call.keywords:
+        if not isinstance(keyword.value, ast.Name) or keyword.arg not in (None, keyword.value.id):
+            return False
+        forwarded.append(keyword.value.id)
+    return forwarded == params
+
+
+def _summary(node):
+    """
+    Summary line and return description of a trivial function.
+
+    :return: Tuple of (summary, return description or None, description of every parameter or None),
+        or None if the function is not trivial.
+    """
+    body = _body(node)
+    params = _params(node)
+    if len(body) != 1:
+        return None
+    statement = body[0]
+    if node.name in _DUNDER_DOCSTRINGS and isinstance(statement, ast.Return):
+        return _DUNDER_DOCSTRINGS[node.name] + (None,)
+    if isinstance(statement, ast.Pass) or (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant)
+                                           and statement.value.value is Ellipsis):
+        return "Do nothing; placeholder to be overridden or filled in.", None, None
+    if isinstance(statement, ast.Raise) and statement.exc is not None:
+        exc = statement.exc.func if isinstance(statement.exc, ast.Call) else statement.exc
+        if isinstance(exc, ast.Name) and exc.id == "NotImplementedError":
+            return "Not implemented here; subclasses must override this method.", None, None
+        return None
+    if isinstance(statement, ast.Return):
+        value = statement.value
+        attribute = _self_attribute(value)
+        if attribute is not None and not params:
+            if _is_property(node):
+                return f"The {_words(attribute)} of the object.", None, None
+            return f"Return the {_words(attribute)} of the object.", f"Value of self.{attribute}.", None
+        if value is None or (isinstance(value, ast.Constant) and value.value is None):
+            return "Do nothing and return None.", None, None
+        if isinstance(value, ast.Constant):
+            return f"Return the constant {ast.unparse(value)}.", f"Always {ast.unparse(value)}.", None
+        if isinstance(value, ast.Call) and _passes_through(value, params):
+            func = ast.unparse(value.func)
+            return f"Call {func} with the same arguments and return its result.", f"Result of {func}.", f"Passed on to {func}."
+        return None
+    if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and len(params) == 1:
+        attribute = _self_attribute(statement.targets[0])
+        if attribute is not None and isinstance(statement.value, ast.Name) and statement.value.id == params[0]:
+            return f"Set the {_words(attribute)} of the object.", None, f"New value of the {_words(attribute)}."
+    return None
+
+
+def trivial_docstring(function_source):
+    """
+    Build a reST docstring for a trivially shaped function, without the model.
+
+    Handles getters (return self.x), setters (self.x = value), common dunder methods,
+    pass-throughs that forward their parameters to another call, constant returns,
+    empty placeholders and NotImplementedError stubs.
+    :param function_source: Source of one function.
+    :return: The docstring, or None if the function is not trivial.
+    """
+    try:
+        node = ast.parse(function_source).body[0]
+    except (SyntaxError, IndexError):
+        return None
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+    trivial = _summary(node)
+    if trivial is None:
+        return None
+    summary, returns, param_text = trivial
+    lines = [summary]
+    params = _params(node)
+    if params:
+        lines.append("")
+        for name in params:
+            lines.append(f":param {name}: {param_text or f'Value of {_words(name)}.'}")
+    if returns is not None:
+        if len(lines) == 1:
+            lines.append("")
+        lines.append(f":return: {returns}")
+    return "\n".join(lines)
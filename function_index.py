@@ -0,0 +1,122 @@
+import ast
+
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_BLOCK_FIELDS = ("body", "handlers", "orelse", "finalbody", "cases") # In source order
+
+
+def _nested_statements(node):
+    """
+    Statements nested in a compound statement (if, for, with, try, match...).
+
+    Functions can only be defined by statements, so expressions are never entered. This
+    keeps the walk shallow however deeply an expression nests.
+    """
+    for field in _BLOCK_FIELDS:
+        for child in getattr(node, field, ()):
+            if isinstance(child, ast.stmt):
+                yield child
+            else:
+                yield from child.body # except handlers and match cases hold their own statements
+
+
+def docstring_node(node):
+    """ The docstring statement of a function node, or None. """
+    first = node.body[0]
+    if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+        return first
+    return None
+
+
+def _docstring_span(node):
+    """ Lines of the existing docstring, if it shares none of them with another statement. """
+    docstring = docstring_node(node)
+    if docstring is None or (len(node.body) > 1 and node.body[1].lineno <= docstring.end_lineno):
+        return None
+    return docstring.lineno, docstring.end_lineno
+
+
+class FunctionRecord:
+    """ Where a function is in its file and whether it is marked with #--. Ids are positions in source order. """
+    __slots__ = ("id", "qualname", "kind", "lineno", "col_offset", "end_lineno", "body_lineno", "marked", "docstring_span")
+
+    def __init__(self, id, qualname, kind, lineno, col_offset, end_lineno, body_lineno, marked, docstring_span=None):
+        self.id = id
+        self.qualname = qualname
+        self.kind = kind  # "FunctionDef" or "AsyncFunctionDef"
+        self.lineno = lineno  # Line of the def keyword (decorators excluded)
+        self.col_offset = col_offset
+        self.end_lineno = end_lineno
+        self.body_lineno = body_lineno  # First statement of the body, whose indentation docstrings follow
+        self.marked = marked
+        self.docstring_span = docstring_span  # (first line, last line) of an existing docstring, or None
+
+    @property
+    def marker_lineno(self):
+        return self.lineno + 1
+
+    def __repr__(self):
+        return f"FunctionRecord({self.id}, {self.qualname!r}, {self.kind}, lines {self.lineno}-{self.end_lineno}{', marked' if self.marked else ''})"
+
+
+class FunctionIndex:
+    """
+    Every function of a file, built from a single parse.
+
+    Records are in source order (a depth-first pre-order walk), so a function's id only
+    depends on the file contents. Extraction, generation and replacement all refer to
+    functions by id, and nodes are found again by (lineno, col_offset) in O(1).
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._by_position = {(record.lineno, record.col_offset): record for record in records}
+
+    @classmethod
+    def build(cls, tree, comments):
+        """
+        Index the functions of a parsed module.
+
+        :param tree: Module returned by ast.parse.
+        :param comments: Dictionary of line numbers to #-- comments, as returned by capture_comments.
+        :return: Tuple of (FunctionIndex, list of the function nodes by id).
+        """
+        records = []
+        nodes = []
+
+        def visit(statements, scope):
+            for child in statements:
+                if isinstance(child, _FUNCTION_TYPES):
+                    qualname = ".".join(scope + [child.name])
+                    marked = "#--" in comments.get(child.lineno + 1, '')
+                    records.append(FunctionRecord(len(records), qualname, type(child).__name__, child.lineno, child.col_offset,
+                                                  child.end_lineno, child.body[0].lineno, marked, _docstring_span(child)))
+                    nodes.append(child)
+                    visit(child.body, scope + [child.name, "<locals>"])
+                elif isinstance(child, ast.ClassDef):
+                    visit(child.body, scope + [child.name])
+                else:
+                    visit(_nested_statements(child), scope)
+
+        visit(tree.body, [])
+        return cls(records), nodes
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, id):
+        return self.records[id]
+
+    def marked(self):
+        """ Records of the #-- functions, in id order. """
+        return [record for record in self.records if record.marked]
+
+    def descendants(self, record):
+        """ Records of the functions nested in record; pre-order keeps them right after it. """
+        end = record.id + 1
+        while end < len(self.records) and self.records[end].lineno <= record.end_lineno:
+            end += 1
+        return self.records[record.id + 1:end]
+
+    def lookup(self, node):
+        """ Record of a function node of the same source, or None. """
+        return self._by_position.get((node.lineno, node.col_offset))
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import subprocess
+
+
+def load_manifest(manifest_file):
+    """ Load the manifest of the previous run, or an empty one if there was none. """
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    return {}
+
+
+def save_manifest(manifest_file, manifest):
+    """ Write the manifest atomically, so an interrupted run never leaves a truncated file behind. """
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def content_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(filename):
+    """ Return the (size, mtime, content hash) entry stored in the manifest for a file. """
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash(filename)}
+
+
+def changed_files(filenames, manifest):
+    """
+    Keep only the files that changed since the manifest was written.
+
+    Size and mtime are compared first; the content is only hashed when they differ,
+    so a touched but unmodified file is still skipped.
+    :param filenames: List of candidate Python files.
+    :param manifest: Dictionary of absolute path to fingerprint from the previous run.
+    :return: List of files that are new or whose content changed.
+    """
+    changed = []
+    for filename in filenames:
+        entry = manifest.get(os.path.abspath(filename))
+        if entry is None:
+            changed.append(filename)
+            continue
+        stat = os.stat(filename)
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+            continue
+        if stat.st_size != entry['size'] or content_hash(filename) != entry['sha256']:
+            changed.append(filename)
+    return changed
+
+
+def git_changed_files(filenames, base_ref):
+    """
+    Keep only the files that differ from base_ref in git, including untracked files.
+
+    :param filenames: List of candidate Python files.
+    :param base_ref: Any git revision, e.g. origin/main.
+    :return: List of files changed since base_ref.
+    """
+    top_level = subprocess.run(["git", "rev-parse", "--show-toplevel"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    diff = subprocess.run(["git", "diff", "--name-only", base_ref, "--"],
+                          capture_output=True, text=True, check=True, cwd=top_level).stdout
+    untracked = subprocess.run(["git", "ls-files", "--others", "--exclude-standard"],
+                               capture_output=True, text=True, check=True, cwd=top_level).stdout
+    changed = {os.path.realpath(os.path.join(top_level, name)) for name in (diff + untracked).splitlines() if name}
+    return [filename for filename in filenames if os.path.realpath(filename) in changed]
+
+
+def update_manifest(manifest, filenames):
+    """ Record the current fingerprint of each processed file. """
+    for filename in filenames:
+        if os.path.exists(filename):
+            manifest[os.path.abspath(filename)] = file_fingerprint(filename)
+    return manifest
@@ -0,0 +1,554 @@
+import ast
+import os
+import time
+from span_writer import replace_marker, docstring_prefix, clean_docstring_response
+from profiling import profiler, function_name
+from scheduler import schedule_batches, padding_report
+
+model_name = "lora_model"
+max_new_tokens = 1024
+max_seq_length = 2048 # Choose any! We auto support RoPE Scaling internally!
+dtype = None # None for auto detection. Float16 for Tesla T4, V100, Bfloat16 for Ampere+
+load_in_4bit = True # Use 4bit quantization to reduce memory usage. Can be False.
+instruction_prompt = "Write detailed and informative comments for the Python function provided. The comments should include a high-level overview of the function's purpose, detailed descriptions of each parameter and what they represent, an explanation of the function's return values, and a line-by-line breakdown of what each part of the code does. The goal is to make the function's operation clear and understandable for someone who may be unfamiliar with the code."
+docstring_instruction_prompt = "Write a detailed and informative docstring for the Python function provided. The docstring should include a high-level overview of the function's purpose, a description of each parameter and what it represents, and an explanation of the function's return values. Respond with the docstring text only, without the surrounding quotes or the function code."
+
+# What the model is asked to produce: the whole commented function, or only its docstring
+instruction_prompts = {
+    "function": instruction_prompt,
+    "docstring": docstring_instruction_prompt,
+}
+
+alpaca_prompt = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
+### Instruction:
+{}
+
+### Input:
+{}
+
+### Response:
+{}"""
+
+
+def prompt_parts(output_mode="function"):
+    """ Split the prompt into (prefix, suffix) around the function; the prefix is identical for every function. """
+    return tuple(alpaca_prompt.format(instruction_prompts[output_mode], "\0", "").split("\0"))
+
+
+prompt_prefix, prompt_suffix = prompt_parts()
+
+
+def model_identity():
+    """Identify the model and adapter weights, so cached outputs are dropped when either changes."""
+    identity = [model_name]
+    if os.path.isdir(model_name):
+        for root, dirs, files in os.walk(model_name):
+            dirs.sort()
+            for f in sorted(files):
+                stat = os.stat(os.path.join(root, f))
+                identity.append(f"{os.path.relpath(os.path.join(root, f), model_name)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(identity)
+
+
+class InferenceBackend:
+    """
+    Interface between the commenter and whatever produces the commented functions.
+
+    Backends load lazily: nothing heavy is imported until generate is first called.
+    """
+    name = "base"
+    use_prefix_cache = False
+    token_stats = () # (generated, budgeted) new tokens of each function of the last generate call
+    token_budget = None # Maximum padded tokens per generate call, on top of batch_size
+    schedule_report = None # Padding efficiency of the last generate call
+
+    def identity(self):
+        """ String identifying the outputs of this backend, used in docstring cache keys. """
+        return self.name
+
+    def load(self):
+        """ Load the model if the backend has one; called automatically by generate. """
+
+    def close(self):
+        """ Release worker processes or other resources held by the backend. """
+
+    def count_tokens(self, text):
+        """ Number of tokens of text; backends without a tokenizer use a rough estimate. """
+        return len(text) // 4 + 1
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        """
+        Generate the commented version of each function.
+
+        :param functions: List of function source strings containing a #-- marker.
+        :param batch_size: Number of functions processed per call to the model.
+        :param new_tokens: Optional list with the max_new_tokens of each function.
+        :param stop_at_docstring: Stop each function as soon as its docstring is complete,
+            for callers that only keep the docstring.
+        :param output_mode: "function" to generate whole commented functions, "docstring" to
+            generate only the docstring text.
+        :return: List of generated functions (or docstrings), in the same order.
+        """
+        raise NotImplementedError
+
+
+class TransformersBackend(InferenceBackend):
+    """ Plain transformers model on the CPU, for machines without CUDA. """
+    name = "transformers"
+    device = "cpu"
+    prefix_cache_supported = True
+
+    def __init__(self, model=None, tokenizer=None, use_prefix_cache=True):
+        """
+        :param model: Already loaded model, or None to load it on first use.
+        :param tokenizer: Tokenizer of model.
+        :param use_prefix_cache: Reuse the past key values of the constant instruction prefix
+            instead of re-encoding it for every function.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.use_prefix_cache = use_prefix_cache
+        self.prefix_cache = {} # output mode -> (prefix ids, past key values)
+
+    def identity(self):
+        return f"{self.name}|{model_identity()}"
+
+    def prefix_cache_enabled(self):
+        return self.use_prefix_cache and self.prefix_cache_supported
+
+    def load_model(self):
+        from transformers import AutoModelForCausalLM, AutoTokenizer # Imported here so runs with nothing to generate never pay for it
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype = "auto")
+        model.eval()
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return model, tokenizer
+
+    def load(self):
+        if self.model is None:
+            with profiler.span("model load"):
+                self.model, self.tokenizer = self.load_model()
+        return self.model, self.tokenizer
+
+    def prepare_for_inference(self, model):
+        """ Hook for backends that switch the model into a faster inference mode. """
+
+    def count_tokens(self, text):
+        _, tokenizer = self.load()
+        return len(tokenizer(text)["input_ids"])
+
+    def build_prefix_cache(self, model, tokenizer, prefix):
+        """
+        Run the shared prompt prefix (header and instruction) through the model once.
+
+        :return: Tuple of (prefix token ids, DynamicCache holding their past key values).
+        """
+        import torch
+        from transformers import DynamicCache
+        prefix_ids = tokenizer(prefix, return_tensors = "pt")["input_ids"].to(self.device)
+        with torch.no_grad():
+            past_key_values = model(input_ids = prefix_ids, use_cache = True).past_key_values
+        if not isinstance(past_key_values, DynamicCache):
+            past_key_values = DynamicCache.from_legacy_cache(past_key_values)
+        return prefix_ids, past_key_values
+
+    def build_inputs(self, tokenizer, batch, output_mode="function"):
+        """
+        Tokenize a batch of functions into generate() keyword arguments.
+
+        With the prefix cache the rows are laid out as [prefix][padding][function + suffix]:
+        the cached prefix is shared by every row, padding sits between prefix and function,
+        and the attention mask hides it, so positions still follow on from the prefix.
+        """
+        import copy
+        import torch
+        if not self.prefix_cache_enabled() or self.prefix_cache.get(output_mode) is None:
+            prompts = [alpaca_prompt.format(instruction_prompts[output_mode], func, "") for func in batch] # output - leave this blank for generation!
+            return dict(tokenizer(prompts, return_tensors = "pt", padding = True).to(self.device))
+        prefix_ids, past_key_values = self.prefix_cache[output_mode]
+        suffix = prompt_parts(output_mode)[1]
+        suffixes = tokenizer([func + suffix for func in batch], return_tensors = "pt", padding = True,
+                             add_special_tokens = False).to(self.device)
+        rows = len(batch)
+        past_key_values = copy.deepcopy(past_key_values) # generate() extends the cache in place
+        past_key_values.batch_repeat_interleave(rows)
+        input_ids = torch.cat([prefix_ids.expand(rows, -1), suffixes["input_ids"]], dim = 1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids).expand(rows, -1), suffixes["attention_mask"]], dim = 1)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "past_key_values": past_key_values}
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        from transformers import StoppingCriteriaList
+        model, tokenizer = self.load()
+        self.prepare_for_inference(model)
+        tokenizer.padding_side = "left" # Decoder-only models must be padded on the left for generation
+        if self.prefix_cache_enabled() and output_mode not in self.prefix_cache:
+            # Once per process and output mode, reused by every batch
+            with profiler.span("prefix cache"):
+                prefix, suffix = prompt_parts(output_mode)
+                if prefix_tokenizes_separately(tokenizer, prefix, suffix):
+                    self.prefix_cache[output_mode] = self.build_prefix_cache(model, tokenizer, prefix)
+                else:
+                    print("Prefix cache disabled: the tokenizer encodes the prompt differently when it is split after the prefix")
+                    self.prefix_cache[output_mode] = None
+        if not functions:
+            return []
+        with profiler.span("schedule"):
+            # Functions of similar length share a batch, across all files, so rows carry little padding
+            lengths = [len(ids) for ids in tokenizer(functions, add_special_tokens = False)["input_ids"]]
+            batches = schedule_batches(lengths, batch_size, new_tokens, self.token_budget)
+            self.schedule_report = padding_report(lengths, batches, batch_size)
+        responses = [None] * len(functions)
+        token_stats = [None] * len(functions)
+        for indices in batches:
+            batch = [functions[i] for i in indices]
+            with profiler.span("tokenize prompts"):
+                inputs = self.build_inputs(tokenizer, batch, output_mode)
+            batch_new_tokens = max(new_tokens[i] for i in indices) if new_tokens else max_new_tokens
+            prompt_length = inputs["input_ids"].shape[1]
+            criteria = [DocstringStoppingCriteria(tokenizer, prompt_length)] if stop_at_docstring else []
+            if profiler.enabled:
+                criteria.append(FirstTokenTimer())
+            batch_start = time.perf_counter()
+            outputs = model.generate(**inputs, max_new_tokens = batch_new_tokens, use_cache = True, stopping_criteria = StoppingCriteriaList(criteria))
+            latency = time.perf_counter() - batch_start
+            if profiler.enabled:
+                first_token = criteria[-1].first_token or batch_start + latency
+                profiler.add("prefill", first_token - batch_start)
+                profiler.add("decode", batch_start + latency - first_token)
+            with profiler.span("decode text"):
+                for row in range(len(batch)):
+                    generated = outputs[row, prompt_length:] # Only the new tokens, the prompt is never decoded
+                    res = tokenizer.decode(generated, skip_special_tokens = True)
+                    if output_mode == "docstring":
+                        res = clean_docstring_response(res)
+                    elif stop_at_docstring:
+                        res = docstring_prefix(res) or res
+                    budget = new_tokens[indices[row]] if new_tokens else max_new_tokens
+                    generated_length = _generated_length(tokenizer, generated.tolist())
+                    token_stats[indices[row]] = (generated_length, budget)
+                    if profiler.enabled:
+                        profiler.record_function(function_name(batch[row]), int(inputs["attention_mask"][row].sum()),
+                                                 generated_length, latency)
+                    responses[indices[row]] = res # Back to the original position
+        self.token_stats = token_stats
+        return responses
+
+
+probe_function = "def probe(items, key=None):\n    #--\n    return sorted(items, key=key)"
+
+
+def prefix_tokenizes_separately(tokenizer, prefix, suffix, function=probe_function):
+    """
+    Check that the cached prefix followed by the separately tokenized function and suffix gives
+    the same ids as the whole prompt, i.e. the prompt the model was trained on.
+
+    SentencePiece tokenizers, for example, add a leading-space piece to the first token of a
+    separately tokenized text, which would silently change every cached prompt.
+    """
+    whole = tokenizer(prefix + function + suffix)["input_ids"]
+    split = tokenizer(prefix)["input_ids"] + tokenizer(function + suffix, add_special_tokens = False)["input_ids"]
+    return list(whole) == list(split)
+
+
+class DocstringStoppingCriteria:
+    """
+    Stop each row of a generate call once its docstring is complete.
+
+    The full check (decode, find the closing quotes, parse) only runs when the last
+    tokens contain triple quotes, so most steps cost a single short decode.
+    """
+
+    def __init__(self, tokenizer, prompt_length):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row in input_ids:
+            generated = row[self.prompt_length:]
+            finished = False
+            tail = self.tokenizer.decode(generated[-3:])
+            if '"""' in tail or "'''" in tail:
+                finished = docstring_prefix(self.tokenizer.decode(generated, skip_special_tokens = True)) is not None
+            done.append(finished)
+        return input_ids.new_tensor(done).bool()
+
+
+class FirstTokenTimer:
+    """ Stopping criterion that never stops, recording when the first token was generated (the end of prefill). """
+
+    def __init__(self):
+        self.first_token = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        return input_ids.new_zeros(input_ids.shape[0]).bool()
+
+
+def _generated_length(tokenizer, generated):
+    """ Number of tokens actually generated for a row, up to and including EOS. """
+    for i, token_id in enumerate(generated):
+        if token_id == tokenizer.eos_token_id:
+            return i + 1
+        if token_id == tokenizer.pad_token_id:
+            return i
+    return len(generated)
+
+
+def token_savings_report(token_stats):
+    """ One-line summary of generated versus budgeted tokens. """
+    generated = sum(count for count, _ in token_stats)
+    budgeted = sum(budget for _, budget in token_stats)
+    saved = budgeted - generated
+    percent = 100.0 * saved / budgeted if budgeted else 0.0
+    return f"Generation: {generated} tokens generated of {budgeted} budgeted, {saved} saved by early stopping ({percent:.1f}%)"
+
+
+class UnslothBackend(TransformersBackend):
+    """ The fine-tuned model loaded through unsloth, in 4bit on CUDA. """
+    name = "unsloth"
+    device = "cuda"
+    # Unsloth's patched prepare_inputs_for_generation treats any past key values as the decode
+    # phase: it keeps only the last input id and derives positions from cache_position, so the
+    # function after a cached prefix would never be encoded. Always send whole prompts.
+    prefix_cache_supported = False
+
+    def load_model(self):
+        from unsloth import FastLanguageModel # Imported here so runs with nothing to generate never pay for it
+        model, tokenizer = FastLanguageModel.from_pretrained(
+            model_name = model_name,
+            max_seq_length = max_seq_length,
+            dtype = dtype,
+            load_in_4bit = load_in_4bit,
+        )
+        FastLanguageModel.for_inference(model) # Enable native 2x faster inference
+        return model, tokenizer
+
+    def prepare_for_inference(self, model):
+        from unsloth import FastLanguageModel
+        FastLanguageModel.for_inference(model) # Enable native 2x faster inference
+
+
+def load_transformers_model():
+    """ Default model factory of CPUPoolBackend: the model and tokenizer of TransformersBackend. """
+    return TransformersBackend().load_model()
+
+
+def load_transformers_tokenizer():
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def tiny_random_tokenizer():
+    """
+    Tokenizer for tests, built locally: byte-level with one token per byte and no merges,
+    so it needs no download and any text round-trips.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+    vocab = {"<unk>": 0, "<s>": 1, "</s>": 2, "<pad>": 3}
+    for symbol in sorted(pre_tokenizers.ByteLevel.alphabet()):
+        vocab[symbol] = len(vocab)
+    tokenizer = Tokenizer(models.BPE(vocab = vocab, merges = [], unk_token = "<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space = False)
+    tokenizer.decoder = decoders.ByteLevel()
+    return PreTrainedTokenizerFast(tokenizer_object = tokenizer, bos_token = "<s>", eos_token = "</s>",
+                                   pad_token = "<pad>", unk_token = "<unk>")
+
+
+def tiny_random_model():
+    """
+    Model factory for tests: a two-layer Llama with seeded random weights and tiny_random_tokenizer.
+
+    Its projections are nn.Linear layers, so --quantize-int8 quantizes it like a real model.
+    """
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+    tokenizer = tiny_random_tokenizer()
+    config = LlamaConfig(vocab_size = len(tokenizer), hidden_size = 64, intermediate_size = 128, num_hidden_layers = 2,
+                         num_attention_heads = 2, num_key_value_heads = 2, max_position_embeddings = max_seq_length,
+                         bos_token_id = tokenizer.bos_token_id, eos_token_id = tokenizer.eos_token_id,
+                         pad_token_id = tokenizer.pad_token_id)
+    torch.manual_seed(0) # Same weights in every worker
+    model = LlamaForCausalLM(config)
+    model.eval()
+    return model, tokenizer
+
+
+_worker_backend = None # TransformersBackend of a CPU pool worker process
+
+
+def _init_cpu_worker(threads, quantize, model_factory, use_prefix_cache, token_budget):
+    """ Initializer of a CPU pool worker: pin the thread count, then load (and quantize) one model copy. """
+    global _worker_backend
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass # Already set, e.g. when the factory ran torch code first
+    model, tokenizer = model_factory()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype = torch.qint8)
+    _worker_backend = TransformersBackend(model, tokenizer, use_prefix_cache)
+    _worker_backend.token_budget = token_budget
+
+
+def _cpu_worker_ready():
+    return os.getpid()
+
+
+def _cpu_worker_generate(functions, batch_size, new_tokens, stop_at_docstring, output_mode):
+    responses = _worker_backend.generate(functions, batch_size, new_tokens, stop_at_docstring, output_mode)
+    return responses, _worker_backend.token_stats, _worker_backend.schedule_report
+
+
+class CPUPoolBackend(InferenceBackend):
+    """
+    Several CPU worker processes, each holding its own copy of the model.
+
+    Each worker pins its torch thread count, so workers do not oversubscribe the cores,
+    and can quantize the Linear layers to int8 with torch dynamic quantization. Functions
+    are dealt round-robin across the workers, which schedule them by length as
+    TransformersBackend does.
+    """
+    name = "cpu-pool"
+
+    def __init__(self, workers=None, threads_per_worker=None, quantize=False, model_factory=None, tokenizer_factory=None,
+                 use_prefix_cache=True):
+        """
+        :param workers: Number of worker processes (default: a quarter of the cores). Each one holds
+            a full model copy, so memory bounds how many can run.
+        :param threads_per_worker: Torch threads per worker (default: the cores divided between the workers).
+        :param quantize: Quantize Linear layers to int8 with torch dynamic quantization.
+        :param model_factory: Picklable function returning (model, tokenizer), called in each worker;
+            defaults to the model of TransformersBackend. Tests can pass tiny_random_model,
+            which needs no download.
+        :param tokenizer_factory: Picklable function returning the tokenizer, used in this process to
+            count tokens; defaults to the tokenizer of model_name.
+        :param use_prefix_cache: Reuse the KV cache of the constant prompt prefix in each worker.
+        """
+        cores = os.cpu_count() or 1
+        self.workers = workers or max(1, cores // 4)
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self.quantize = quantize
+        self.model_factory = model_factory or load_transformers_model
+        self.tokenizer_factory = tokenizer_factory or load_transformers_tokenizer
+        self.use_prefix_cache = use_prefix_cache
+        self.tokenizer = None
+        self.pool = None
+
+    def identity(self):
+        factory = f"{self.model_factory.__module__}.{self.model_factory.__qualname__}"
+        return f"{self.name}|{factory}|{model_identity()}|{'int8' if self.quantize else 'full'}"
+
+    def load(self):
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(
+                max_workers = self.workers,
+                mp_context = multiprocessing.get_context("spawn"), # Forking a process that imported torch is unsafe
+                initializer = _init_cpu_worker,
+                initargs = (self.threads_per_worker, self.quantize, self.model_factory, self.use_prefix_cache, self.token_budget),
+            )
+            with profiler.span("model load"):
+                # Start every worker now, so the models load in parallel and before the first request
+                for future in [self.pool.submit(_cpu_worker_ready) for _ in range(self.workers)]:
+                    future.result()
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def count_tokens(self, text):
+        if self.tokenizer is None:
+            self.tokenizer = self.tokenizer_factory()
+        return len(self.tokenizer(text)["input_ids"])
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        if not functions:
+            return []
+        pool = self.load()
+        shards = [list(range(worker, len(functions), self.workers)) for worker in range(min(self.workers, len(functions)))]
+        futures = [pool.submit(_cpu_worker_generate, [functions[i] for i in shard], batch_size,
+                               [new_tokens[i] for i in shard] if new_tokens else None, stop_at_docstring, output_mode)
+                   for shard in shards]
+        responses = [None] * len(functions)
+        token_stats = [None] * len(functions)
+        reports = []
+        for shard, future in zip(shards, futures):
+            shard_responses, shard_stats, report = future.result()
+            for i, res, stats in zip(shard, shard_responses, shard_stats):
+                responses[i] = res
+                token_stats[i] = stats
+            reports.append(report)
+        self.token_stats = token_stats
+        self.schedule_report = "\n".join(f"Worker {worker}: {report}" for worker, report in enumerate(reports))
+        return responses
+
+
+class StubBackend(InferenceBackend):
+    """ Deterministic docstrings built from the signature, for tests and dry runs. No model is loaded. """
+    name = "stub"
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        responses = []
+        for func in functions:
+            start = time.perf_counter()
+            res = stub_docstring(ast.parse(func).body[0]) if output_mode == "docstring" else stub_function(func)
+            if profiler.enabled:
+                profiler.record_function(function_name(func), self.count_tokens(func), self.count_tokens(res),
+                                         time.perf_counter() - start)
+            responses.append(res)
+        return responses
+
+
+def stub_docstring(node):
+    """ Build a reST docstring from a function's signature. """
+    lines = [f"Stub docstring for {node.name}.", ""]
+    for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+        if arg.arg in ("self", "cls"):
+            continue
+        lines.append(f":param {arg.arg}: Value of {arg.arg}.")
+    lines.append(":return: Result of the function.")
+    return "\n".join(lines)
+
+
+def stub_function(function_source):
+    """ Replace the #-- marker of function_source with a stub docstring. """
+    try:
+        node = ast.parse(function_source).body[0]
+    except (SyntaxError, IndexError):
+        return function_source
+    return replace_marker(function_source, stub_docstring(node))
+
+
+backends = {
+    "unsloth": UnslothBackend,
+    "transformers": TransformersBackend,
+    "cpu-pool": CPUPoolBackend,
+    "stub": StubBackend,
+}
+
+
+def backend_options(args):
+    """ Constructor options of the backend selected on the command line. """
+    if args.backend == "cpu-pool":
+        return {"workers": args.cpu_workers, "threads_per_worker": args.cpu_threads, "quantize": args.quantize_int8}
+    return {}
+
+
+def get_backend(name, use_prefix_cache=True, token_budget=None, **options):
+    """ Create the backend registered under name; options are passed to its constructor. """
+    backend = backends[name](**options)
+    backend.use_prefix_cache = use_prefix_cache
+    backend.token_budget = token_budget
+    return backend
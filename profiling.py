@@ -0,0 +1,158 @@
+import json
+import time
+from contextlib import nullcontext
+
+_DISABLED_SPAN = nullcontext() # Shared and reusable, so a disabled span costs one attribute check
+
+
+class FunctionMetrics:
+    """ Generation metrics of one function. """
+    __slots__ = ("name", "prompt_tokens", "generated_tokens", "latency")
+
+    def __init__(self, name, prompt_tokens, generated_tokens, latency):
+        self.name = name
+        self.prompt_tokens = prompt_tokens
+        self.generated_tokens = generated_tokens
+        self.latency = latency  # Seconds of the generate call the function was part of
+
+    @property
+    def tokens_per_sec(self):
+        return self.generated_tokens / self.latency if self.latency else 0.0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "prompt_tokens": self.prompt_tokens,
+            "generated_tokens": self.generated_tokens,
+            "latency": self.latency,
+            "tokens_per_sec": self.tokens_per_sec,
+        }
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Timing spans around the stages of a run, plus per-function generation metrics.
+
+    Disabled by default: span() then returns a shared no-op context manager and
+    record_function() returns immediately.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.stages = {} # stage name -> [calls, seconds], in the order stages were first seen
+        self.functions = []
+        self.token_budgets = [] # (function name, generated tokens, max_new_tokens budget)
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def reset(self):
+        """ Forget every stage and function recorded so far. """
+        self.stages = {}
+        self.functions = []
+        self.token_budgets = []
+
+    def span(self, name):
+        """ Context manager timing one occurrence of the stage name. """
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return _Span(self, name)
+
+    def add(self, name, seconds, calls=1):
+        """ Add time measured outside of span() to the stage name. """
+        stage = self.stages.setdefault(name, [0, 0.0])
+        stage[0] += calls
+        stage[1] += seconds
+
+    def record_function(self, name, prompt_tokens, generated_tokens, latency):
+        if self.enabled:
+            self.functions.append(FunctionMetrics(name, prompt_tokens, generated_tokens, latency))
+
+    def record_token_budget(self, name, generated_tokens, budget_tokens):
+        """ Record how many of its budgeted new tokens a function used, to measure early stopping. """
+        if self.enabled:
+            self.token_budgets.append((name, generated_tokens, budget_tokens))
+
+    def drain(self):
+        """ Return the stages recorded so far and reset them, for sending from a worker process. """
+        stages, self.stages = self.stages, {}
+        return stages
+
+    def merge(self, stages):
+        """ Add the stages drained from another profiler, e.g. a worker process. """
+        for name, (calls, seconds) in stages.items():
+            self.add(name, seconds, calls)
+
+    def to_dict(self):
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "stages": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.stages.items()},
+            "functions": [metrics.to_dict() for metrics in self.functions],
+            "token_budgets": [{"name": name, "generated_tokens": generated, "budget_tokens": budget, "saved_tokens": budget - generated}
+                              for name, generated, budget in self.token_budgets],
+        }
+
+    def write(self, path):
+        """ Write the metrics as JSON to path. """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    def report(self, slowest=5):
+        """ Summary table of the stages and the generated functions. """
+        wall = time.perf_counter() - self.started
+        lines = [f"{'Stage':<28}{'Calls':>8}{'Seconds':>12}{'% wall':>9}"]
+        for name, (calls, seconds) in self.stages.items():
+            lines.append(f"{name:<28}{calls:>8}{seconds:>12.3f}{100.0 * seconds / wall if wall else 0.0:>8.1f}%")
+        lines.append(f"{'wall time':<28}{'':>8}{wall:>12.3f}")
+        if self.functions:
+            prompt = sum(metrics.prompt_tokens for metrics in self.functions)
+            generated = sum(metrics.generated_tokens for metrics in self.functions)
+            latency = sum(metrics.latency for metrics in self.functions) / len(self.functions)
+            generation = self.stages.get("generate", [0, 0.0])[1]
+            lines.append("")
+            lines.append(f"Functions: {len(self.functions)}, {prompt} prompt tokens, {generated} generated tokens, "
+                         f"mean latency {latency:.3f}s, {generated / generation if generation else 0.0:.1f} tokens/sec overall")
+            lines.append(f"{'Slowest functions':<40}{'Prompt':>8}{'Generated':>11}{'Seconds':>10}{'Tok/s':>9}")
+            for metrics in sorted(self.functions, key=lambda metrics: metrics.latency, reverse=True)[:slowest]:
+                lines.append(f"{metrics.name[:39]:<40}{metrics.prompt_tokens:>8}{metrics.generated_tokens:>11}"
+                             f"{metrics.latency:>10.3f}{metrics.tokens_per_sec:>9.1f}")
+        return "\n".join(lines)
+
+
+def function_name(function_source):
+    """ Name of the function defined in function_source, without parsing it. """
+    head = function_source.split("(", 1)[0].split()
+    return head[-1] if head else "?"
+
+
+# Process-wide profiler; enabled by --profile or --metrics-out
+profiler = Profiler()
+
+
+def enable_in_worker():
+    """
+    Process pool initializer enabling the global profiler of a worker.
+
+    Forked workers inherit the parent's stages, which would otherwise be drained and merged
+    back into the parent a second time.
+    """
+    profiler.reset()
+    profiler.enable()
@@ -0,0 +1,114 @@
+import ast
+from inference_backends import alpaca_prompt, instruction_prompts, max_new_tokens, max_seq_length
+
+# Generation budget for the docstring itself, on top of reproducing the function
+docstring_base_tokens = 96
+docstring_tokens_per_param = 40
+budget_margin = 1.25
+
+_BLOCK_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+class PromptPlan:
+    """ What is sent to the model for one function, and how many tokens it may generate. """
+    __slots__ = ("source", "prompt_tokens", "max_new_tokens", "status")
+
+    def __init__(self, source, prompt_tokens, max_new_tokens, status):
+        self.source = source
+        self.prompt_tokens = prompt_tokens
+        self.max_new_tokens = max_new_tokens
+        self.status = status  # "full", "condensed" or "skipped"
+
+
+def count_params(function_source):
+    try:
+        node = ast.parse(function_source).body[0]
+    except (SyntaxError, IndexError):
+        return 0
+    args = node.args
+    names = [arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs]
+    names += [arg.arg for arg in (args.vararg, args.kwarg) if arg is not None]
+    return len([name for name in names if name not in ("self", "cls")])
+
+
+def generation_budget(function_tokens, num_params, cap=max_new_tokens):
+    """ Tokens needed to reproduce a function of function_tokens tokens plus its docstring, capped at cap. """
+    needed = (function_tokens + docstring_base_tokens + docstring_tokens_per_param * num_params) * budget_margin
+    return min(int(needed), cap)
+
+
+def _elide_blocks(statement):
+    """ Replace the bodies of a compound statement with `...`, keeping its header. """
+    for field in _BLOCK_FIELDS:
+        block = getattr(statement, field, None)
+        if not block:
+            continue
+        if field in ("handlers", "cases"):
+            for child in block:
+                child.body = [ast.Expr(ast.Constant(Ellipsis))]
+        else:
+            setattr(statement, field, [ast.Expr(ast.Constant(Ellipsis))])
+
+
+def condense_function(function_source, keep_statements=True):
+    """
+    Build a condensed view of a function for prompts that do not fit in the context.
+
+    :param function_source: Function source containing the #-- marker after the def line.
+    :param keep_statements: Keep the top-level statements (with nested blocks elided);
+        when False only the signature is kept.
+    :return: Condensed function source, with the #-- marker after the def line.
+    """
+    node = ast.parse(function_source).body[0]
+    if keep_statements:
+        for statement in node.body:
+            _elide_blocks(statement)
+    else:
+        node.body = [ast.Expr(ast.Constant(Ellipsis))]
+    node.decorator_list = []
+    lines = ast.unparse(node).splitlines()
+    lines.insert(1, "    #--")
+    return "\n".join(lines)
+
+
+def plan_prompts(functions, count_tokens, allow_condensed=True, context=max_seq_length, cap=max_new_tokens, output_mode="function"):
+    """
+    Size the generation budget of each function and condense the ones that overflow the context.
+
+    :param functions: List of function source strings.
+    :param count_tokens: Function returning the number of tokens of a string.
+    :param allow_condensed: Send a condensed view of oversized functions instead of skipping them.
+    :param context: Maximum sequence length of the model.
+    :param cap: Upper bound for max_new_tokens.
+    :param output_mode: "function" when the model reproduces the function, "docstring" when it
+        only writes the docstring (the budget then does not grow with the function body).
+    :return: List of PromptPlan, in the same order as functions.
+    """
+    plans = []
+    for func in functions:
+        num_params = count_params(func)
+        candidates = [("full", func)]
+        if allow_condensed:
+            try:
+                candidates += [("condensed", condense_function(func)), ("condensed", condense_function(func, False))]
+            except (SyntaxError, IndexError):
+                pass
+        plan = PromptPlan(func, 0, 0, "skipped")
+        for status, source in candidates:
+            prompt_tokens = count_tokens(alpaca_prompt.format(instruction_prompts[output_mode], source, ""))
+            function_tokens = count_tokens(source) if output_mode == "function" else 0
+            budget = generation_budget(function_tokens, num_params, cap)
+            if prompt_tokens + budget <= context:
+                plan = PromptPlan(source, prompt_tokens, budget, status)
+                break
+        plans.append(plan)
+    return plans
+
+
+def plan_report(plans):
+    """ One-line summary of how many functions were condensed or skipped. """
+    condensed = sum(1 for plan in plans if plan.status == "condensed")
+    skipped = sum(1 for plan in plans if plan.status == "skipped")
+    budget = sum(plan.max_new_tokens for plan in plans)
+    return (f"Prompt planner: {len(plans) - condensed - skipped} full, {condensed} condensed, "
+            f"{skipped} skipped, {budget} new tokens reserved (vs {len(plans) * max_new_tokens} fixed)")
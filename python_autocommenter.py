@@ -1,36 +1,47 @@
 import argparse
 import sys
-import token
 import os
-import tokenize
 import ast
-from io import StringIO, BytesIO
-import json
-from unsloth import FastLanguageModel
-import torch
-import astor
-max_seq_length = 2048 # Choose any! We auto support RoPE Scaling internally!
-dtype = None # None for auto detection. Float16 for Tesla T4, V100, Bfloat16 for Ampere+
-load_in_4bit = True # Use 4bit quantization to reduce memory usage. Can be False.
-instruction_prompt = "Write detailed and informative comments for the Python function provided. The comments should include a high-level overview of the function's purpose, detailed descriptions of each parameter and what they represent, an explanation of the function's return values, and a line-by-line breakdown of what each part of the code does. The goal is to make the function's operation clear and understandable for someone who may be unfamiliar with the code."
-
-alpaca_prompt = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
-### Instruction:
-{}
-
-### Input:
-{}
-
-### Response:
-{}"""
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from token_rewriter import TokenRewriter
+from span_writer import docstring_from_generated, splice_docstrings, line_indent, write_atomic, replace_marker
+from fast_path import trivial_docstring
+from function_index import FunctionIndex, docstring_node
+from docstring_cache import DocstringCache, cache_key
+from incremental import load_manifest, save_manifest, changed_files, git_changed_files, update_manifest
+from prompt_planner import plan_prompts, plan_report
+from profiling import profiler, enable_in_worker, function_name
+from inference_backends import (UnslothBackend, get_backend, backends, backend_options, token_savings_report, max_new_tokens, max_seq_length,
+                                load_in_4bit, instruction_prompt, alpaca_prompt)
 
 
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Add Comments to a Python File")
-    parser.add_argument("filename", type = str, help="Python file to process")
+    parser.add_argument("filename", type = str, nargs="+", help="Python files, directories or glob patterns to process")
     parser.add_argument("--num_tokens", type= int, default=2048, help="Number of tokens from LLM")
+    parser.add_argument("--batch-size", type= int, default=1, help="Number of functions sent to the model per generate call")
+    parser.add_argument("--jobs", type= int, default=None, help="Number of processes used to parse files (default: CPU count)")
+    parser.add_argument("--cache-dir", type= str, default=".autocommenter_cache", help="Directory of the persistent docstring cache")
+    parser.add_argument("--cache-size-mb", type= int, default=256, help="Size of the docstring cache before least recently used entries are evicted")
+    parser.add_argument("--no-cache", action="store_true", help="Always regenerate, without reading or writing the cache")
+    parser.add_argument("--writer", choices=["splice", "astor"], default="splice", help="splice only inserts docstrings into the original text; astor re-renders the whole file")
+    parser.add_argument("--incremental", action="store_true", help="Only process files that changed since the last run")
+    parser.add_argument("--manifest", type= str, default=".autocommenter_manifest.json", help="Manifest of file fingerprints used by --incremental")
+    parser.add_argument("--since", type= str, default=None, help="Only process files changed since this git ref")
+    parser.add_argument("--backend", choices=sorted(backends), default="unsloth", help="unsloth (CUDA), transformers (CPU), cpu-pool (several CPU worker processes) or stub (no model, for tests)")
+    parser.add_argument("--cpu-workers", type= int, default=None, help="cpu-pool: number of worker processes, each holding a model copy (default: a quarter of the cores)")
+    parser.add_argument("--cpu-threads", type= int, default=None, help="cpu-pool: torch threads per worker (default: cores divided between the workers)")
+    parser.add_argument("--quantize-int8", action="store_true", help="cpu-pool: quantize Linear layers to int8 with torch dynamic quantization")
+    parser.add_argument("--token-budget", type= int, default=None, help="Maximum padded prompt plus new tokens per generate call; functions are batched by length up to --batch-size rows")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Re-encode the instruction prompt for every function instead of reusing its KV cache")
+    parser.add_argument("--output-mode", choices=["function", "docstring"], default="function", help="Generate whole commented functions, or only docstrings (needs a model trained on collect_dataset_strings.py --output-mode docstring)")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send trivial getters, setters and pass-throughs to the model too, instead of documenting them by rule")
+    parser.add_argument("--dry-run", action="store_true", help="List the functions that would be commented and exit without loading a model")
+    parser.add_argument("--profile", action="store_true", help="Time each stage and print a summary table at the end")
+    parser.add_argument("--metrics-out", type= str, default=None, help="Write stage timings and per-function generation metrics as JSON to this file")
     return parser.parse_args()
 
 
@@ -38,118 +49,422 @@ def parse_args():
 
 ### Loading up model and getting response from model 
 def load_finedtuned_model():
-    model, tokenizer = FastLanguageModel.from_pretrained(
-        model_name = "lora_model",
-        max_seq_length = max_seq_length,
-        dtype = dtype,
-        load_in_4bit = load_in_4bit,
-    )
-    FastLanguageModel.for_inference(model) # Enable native 2x faster inference
+    return UnslothBackend().load()
 
-    return model, tokenizer
+def generation_params():
+    """Parameters that change what the model generates for a function."""
+    return {
+        "max_new_tokens": max_new_tokens,
+        "max_seq_length": max_seq_length,
+        "load_in_4bit": load_in_4bit,
+        "prompt": alpaca_prompt.format(instruction_prompt, "", ""),
+    }
 
 def output_from_model(model, tokenizer, input):
-    FastLanguageModel.for_inference(model) # Enable native 2x faster inference
-    inputs = tokenizer(
-    [
-        alpaca_prompt.format(
-            "Write detailed and informative comments for the Python function provided. The comments should include a high-level overview of the function's purpose, detailed descriptions of each parameter and what they represent, an explanation of the function's return values, and a line-by-line breakdown of what each part of the code does. The goal is to make the function's operation clear and understandable for someone who may be unfamiliar with the code.", # instruction
-            input,
-            "", # output - leave this blank for generation!
-        )
-    ], return_tensors = "pt").to("cuda")
-    
-    outputs = model.generate(**inputs, max_new_tokens = 1024, use_cache = True)
-    m_out = tokenizer.batch_decode(outputs)
-    res = m_out[0].split("### Response:\n", 1)
-    
-    return res[1][0:-15]
+    return output_from_model_batch(model, tokenizer, [input])[0]
+
+def output_from_model_batch(model, tokenizer, functions, batch_size=1):
+    """
+    Generate commented versions of several functions, batch_size prompts per generate call.
+
+    :param model: The loaded model returned by load_finedtuned_model.
+    :param tokenizer: The tokenizer returned by load_finedtuned_model.
+    :param functions: List of function source strings to comment.
+    :param batch_size: Number of prompts padded together into one generate call.
+    :return: List of responses, in the same order as functions.
+    """
+    return UnslothBackend(model, tokenizer).generate(functions, batch_size)
+
+def set_docstring(node, docstring):
+    """ Make docstring the docstring of a function node, replacing the one it has. """
+    statement = ast.Expr(ast.Constant(docstring))
+    if docstring_node(node) is not None:
+        node.body[0] = statement
+    else:
+        node.body.insert(0, statement)
+
 
 class ReplaceFunctionTransformer(ast.NodeTransformer):
-    def __init__(self, comments, new_functions):
+    def __init__(self, index, new_functions, output_mode="function"):
         """
         Initialize the transformer.
-        :param comments: Dictionary of line numbers to comments.
-        :param new_functions: List of strings, each containing a new function code.
+        :param index: FunctionIndex of the source the tree was parsed from.
+        :param new_functions: Dictionary of function id to the new function code.
+        :param output_mode: "docstring" if new_functions only hold docstrings, which are then
+            inserted into the original nodes instead of replacing them.
         """
-        self.comments = comments
-        self.new_functions = iter(new_functions)  # Create an iterator from the list
+        self.index = index
+        self.new_functions = new_functions
+        self.output_mode = output_mode
 
     def visit_FunctionDef(self, node):
         """
-        Visit a function definition and replace it if there is a #-- comment directly after.
+        Visit a function definition and replace it if a new version was generated for it.
         """
-        if "#--" in self.comments.get(node.lineno + 1, ''):
-            try:
-                new_function_code = next(self.new_functions)  # Get the next function code
-                new_function_node = ast.parse(new_function_code).body[0]  # Parse it into an AST node
-                return new_function_node  # Replace the current node with the new one
-            except StopIteration:
-                pass  # No more new functions available
-        return self.generic_visit(node)  # Continue visiting other nodes
+        record = self.index.lookup(node)
+        new_function_code = self.new_functions.get(record.id) if record is not None else None
+        if new_function_code is None:
+            return self.generic_visit(node)  # Not marked, or skipped by the prompt planner: keep the original
+        if self.output_mode == "docstring":
+            set_docstring(node, new_function_code)  # Keep the original body
+            return self.generic_visit(node)
+        new_function_node = ast.parse(new_function_code).body[0]  # Parse it into an AST node
+        if any(self.new_functions.get(nested.id) is not None for nested in self.index.descendants(record)):
+            # Replacing the whole node would drop the functions generated for its nested functions,
+            # so only its docstring is taken and the nested ones are replaced in the original body
+            docstring = ast.get_docstring(new_function_node)
+            if docstring is not None:
+                set_docstring(node, docstring)
+            return self.generic_visit(node)
+        return new_function_node  # Replace the current node with the new one
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+
+def index_functions(source_code, comments):
+    """
+    Parse source code once, index its functions and extract the #-- ones as strings.
+
+    :param source_code: Contents of the file.
+    :param comments: Dictionary of line numbers to #-- comments.
+    :return: Tuple of (FunctionIndex, dictionary of function id to function source with #--
+        right after the def line), in source order.
+    """
+    import astor # Imported here so --help and --dry-run never pay for it
+    index, nodes = FunctionIndex.build(ast.parse(source_code), comments)
+    functions = {}
+    for record in index.marked():
+        node = nodes[record.id]
+        if docstring_node(node) is not None:
+            # The marker stands in for the docstring, as in the training data, so the old one is not shown
+            node.body = node.body[1:] or [ast.Pass()]
+        # Convert the AST node back to source code
+        lines = astor.to_source(node).splitlines()
+        # Insert #-- right after the function declaration line, below any decorators
+        if len(lines) > 1:
+            lines.insert(1 + len(node.decorator_list), "    #--")
+        functions[record.id] = "\n".join(lines)
+    return index, functions
+
 
 def find_functions_with_comments(source_code, comments):
     """Parse source code and extract entire functions as strings, adding #-- right after the function declaration."""
-    tree = ast.parse(source_code)
-    functions_with_comments = []
+    return list(index_functions(source_code, comments)[1].values())
 
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Check for a #-- comment on the line immediately after the function definition
-            if "#--" in comments.get(node.lineno + 1, ''):
-                # Convert the AST node back to source code
-                function_source = astor.to_source(node)
-                # Insert #-- right after the function declaration line
-                lines = function_source.splitlines()
-                if len(lines) > 1:
-                    lines.insert(1, "    #--")
-                function_source_with_comment = "\n".join(lines)
-                functions_with_comments.append(function_source_with_comment)
 
-    return functions_with_comments
+def capture_comments(source_code):
+    rewriter = TokenRewriter(capture_markers=True, emit=False) # Only the #-- line numbers are needed here
+    return rewriter.feed(source_code).comments
 
 
-def capture_comments(source_code):
-    tokens = tokenize.tokenize(BytesIO(source_code.encode('utf-8')).readline)
-    comments = {}
-    for toktype, tokval, (srow, _), _, _ in tokens:
-        if toktype == tokenize.COMMENT:
-            if tokval == "#--":    
-                comments[srow] = tokval  # Store line number and comment
-    return comments
 
+def collect_python_files(paths):
+    """
+    Expand files, directories and glob patterns into a sorted list of Python files.
+
+    :param paths: List of file paths, directory paths or glob patterns.
+    :return: List of unique Python file paths.
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+                filenames.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.py'))
+        elif glob.has_magic(path):
+            filenames.extend(sorted(f for f in glob.glob(path, recursive=True) if f.endswith('.py')))
+        else:
+            filenames.append(path)
+    return list(dict.fromkeys(filenames))
+
+
+def prepare_file(filename):
+    """
+    Read a file and extract the functions marked with #--.
+
+    Runs in a worker process, so errors are returned instead of raised.
+    :param filename: Python file to read.
+    :return: Tuple of (filename, source code, FunctionIndex, dictionary of function id to
+        function source, error).
+    """
+    try:
+        with profiler.span("read files"):
+            with open(filename, 'r', encoding='utf-8', newline='') as file: # Keep line endings so the splice writer copies them verbatim
+                source_code = file.read()
+        if "#--" not in source_code:
+            return filename, source_code, FunctionIndex([]), {}, None # Nothing to comment, skip tokenizing and parsing
+        with profiler.span("tokenize"):
+            dic_comments = capture_comments(source_code)
+        with profiler.span("ast walk"):
+            index, functions = index_functions(source_code, dic_comments)
+        return filename, source_code, index, functions, None
+    except Exception as e:
+        return filename, None, None, {}, str(e)
+
+
+def prepare_file_profiled(filename):
+    """ prepare_file for a profiled worker process: also returns the stage timings it recorded. """
+    return prepare_file(filename), profiler.drain()
+
+
+def assign_outputs(prepared, outputs):
+    """
+    Split the generated outputs of all files back into one dictionary per file.
+
+    :param prepared: List of prepare_file results.
+    :param outputs: Generated outputs, in the order of the functions of prepared.
+    :return: List with a dictionary of function id to output for each file.
+    """
+    outputs = iter(outputs)
+    return [{id: next(outputs) for id in functions} for _, _, _, functions, _ in prepared]
+
+
+def write_commented_file(filename, source_code, index, modified_funcs, writer="splice", output_mode="function"):
+    """
+    Write the commented versions of the #-- functions of a file back to it.
+
+    :param filename: File to write.
+    :param source_code: Original contents of the file.
+    :param index: FunctionIndex built from source_code by prepare_file.
+    :param modified_funcs: Dictionary of function id to generated function (None for skipped ones).
+    :param writer: "splice" inserts only the docstrings into the original text, leaving every
+        other line untouched; "astor" replaces the whole functions and re-renders the file.
+    :param output_mode: "docstring" if modified_funcs hold only the generated docstrings.
+    :return: Number of functions written.
+    """
+    if writer == "astor":
+        import astor
+        with profiler.span("render"):
+            transformer = ReplaceFunctionTransformer(index, modified_funcs, output_mode)
+            modified_ast = transformer.visit(ast.parse(source_code))
+
+            modified_code = astor.to_source(modified_ast)
+
+        with profiler.span("write files"):
+            with open(filename, 'w') as file:
+                file.write(modified_code)
+        return sum(1 for mod_func in modified_funcs.values() if mod_func is not None)
+
+    source_lines = source_code.splitlines(keepends=True) # The index holds every position needed, no second parse
+    docstrings = {}
+    for id, mod_func in modified_funcs.items():
+        docstring = mod_func if output_mode == "docstring" else docstring_from_generated(mod_func)
+        if docstring is not None:
+            record = index[id]
+            docstrings[record.marker_lineno] = (docstring, line_indent(source_lines, record.body_lineno), record.docstring_span)
+    if docstrings:
+        with profiler.span("render"):
+            modified_code = splice_docstrings(source_code, docstrings)
+        with profiler.span("write files"):
+            write_atomic(filename, modified_code)
+    return len(docstrings)
+
+
+def generate_functions(functions, batch_size=1, cache=None, backend=None, docstring_only=False, output_mode="function", fast_path=True):
+    """
+    Generate the commented version of each function, skipping the model for trivial and cached ones.
+
+    The backend only loads its model when at least one non-trivial function misses the cache.
+    Functions that do not fit in the context are sent condensed, or skipped (None).
+    :param functions: List of function source strings to comment.
+    :param batch_size: Number of functions sent to the model per generate call.
+    :param cache: DocstringCache to read and fill, or None to always generate.
+    :param backend: InferenceBackend producing the functions; defaults to UnslothBackend.
+    :param docstring_only: Only the docstring of each response is used, which allows condensed
+        prompts and stopping generation at the end of the docstring. Only set it for the splice
+        writer: with it, responses are cut after the docstring and cannot replace whole functions.
+    :param output_mode: "function" to generate whole functions, "docstring" to generate only
+        the docstrings, which are then inserted into the original functions.
+    :param fast_path: Document trivially shaped functions (getters, setters, pass-throughs...) by
+        rule instead of with the model.
+    :return: List of responses, in the same order as functions.
+    """
+    backend = backend or UnslothBackend()
+    modified_funcs = [None] * len(functions)
+    keys = [None] * len(functions)
+    if fast_path and functions:
+        with profiler.span("fast path"):
+            for i, func in enumerate(functions):
+                docstring = trivial_docstring(func)
+                if docstring is not None:
+                    modified_funcs[i] = docstring if output_mode == "docstring" else replace_marker(func, docstring)
+            trivial = sum(1 for mod_func in modified_funcs if mod_func is not None)
+        print(f"Fast path: {trivial} of {len(functions)} functions documented without the model")
+    if cache is not None:
+        with profiler.span("cache lookup"):
+            identity, params = backend.identity(), dict(generation_params(), docstring_only=docstring_only, output_mode=output_mode)
+            for i, func in enumerate(functions):
+                if modified_funcs[i] is None:
+                    keys[i] = cache_key(func, identity, params)
+                    modified_funcs[i] = cache.get(keys[i])
+
+    pending = [i for i, mod_func in enumerate(modified_funcs) if mod_func is None]
+    if pending:
+        docstring_only = docstring_only or output_mode == "docstring"
+        with profiler.span("prompt planning"):
+            plans = plan_prompts([functions[i] for i in pending], backend.count_tokens, docstring_only, output_mode=output_mode)
+        print(plan_report(plans))
+        planned = [(i, plan) for i, plan in zip(pending, plans) if plan.status != "skipped"]
+        with profiler.span("generate"):
+            generated = backend.generate([plan.source for _, plan in planned], batch_size,
+                                         [plan.max_new_tokens for _, plan in planned],
+                                         docstring_only and output_mode == "function", output_mode)
+        if backend.schedule_report:
+            print(backend.schedule_report)
+        if backend.token_stats:
+            print(token_savings_report(backend.token_stats))
+            for (i, _), (generated_tokens, budget_tokens) in zip(planned, backend.token_stats):
+                profiler.record_token_budget(function_name(functions[i]), generated_tokens, budget_tokens)
+        for (i, _), mod_func in zip(planned, generated):
+            modified_funcs[i] = mod_func
+            if cache is not None and mod_func is not None: # An empty reply is not cached, so it is retried next run
+                cache.put(keys[i], mod_func)
+    if cache is not None:
+        cache.commit() # One transaction per batch of functions
+    return modified_funcs
+
+
+def list_marked_functions(filename):
+    """
+    List the #-- functions of a file without rendering them, for --dry-run.
+
+    :param filename: Python file to read.
+    :return: List of (line number, qualified function name).
+    """
+    with open(filename, 'r', encoding='utf-8') as file:
+        source_code = file.read()
+    if "#--" not in source_code:
+        return []
+    index, _ = FunctionIndex.build(ast.parse(source_code), capture_comments(source_code))
+    return [(record.lineno, record.qualname) for record in index.marked()]
+
+
+def comment_files(filenames, batch_size=1, jobs=None, cache=None, writer="splice", backend=None, output_mode="function", fast_path=True):
+    """
+    Comment every #-- function of every file with a single model load.
+
+    :param filenames: List of Python files to process.
+    :param batch_size: Number of functions sent to the model per generate call.
+    :param jobs: Number of processes used to parse files.
+    :param cache: DocstringCache used to skip functions commented before, or None.
+    :param writer: "splice" or "astor", see write_commented_file.
+    :param backend: InferenceBackend producing the functions; defaults to UnslothBackend.
+    :param output_mode: "function" or "docstring", see generate_functions.
+    :param fast_path: Document trivial functions by rule, see generate_functions.
+    :return: Dictionary of filename to FileResult.
+    """
+    if not filenames:
+        return {}
+    with profiler.span("parse files (wall)"):
+        if profiler.enabled:
+            # Worker stages are summed over processes, so they can exceed the wall time of this span
+            with ProcessPoolExecutor(max_workers=jobs, initializer=enable_in_worker) as pool:
+                prepared = []
+                for result, stages in pool.map(prepare_file_profiled, filenames, chunksize=8):
+                    prepared.append(result)
+                    profiler.merge(stages)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                prepared = list(pool.map(prepare_file, filenames, chunksize=8))
+
+    all_functions = []
+    for _, _, _, functions, _ in prepared:
+        all_functions.extend(functions.values())
+
+    modified_funcs = generate_functions(all_functions, batch_size, cache, backend, docstring_only=(writer == "splice"), output_mode=output_mode, fast_path=fast_path)
+    for mod_func in modified_funcs:
+        if mod_func is not None:
+            print(mod_func)
+
+    return write_files(prepared, modified_funcs, writer, output_mode)
+
+
+class FileResult:
+    """ Outcome of commenting one file: functions written, functions marked, and the error if it failed. """
+    __slots__ = ("written", "expected", "error")
+
+    def __init__(self, written=0, expected=0, error=None):
+        self.written = written
+        self.expected = expected
+        self.error = error
+
+    @property
+    def finished(self):
+        """ True if every #-- function was written, so --incremental can skip the file next time. """
+        return self.error is None and self.written == self.expected
+
+    def __str__(self):
+        if self.error is not None:
+            return f"error: {self.error}"
+        if not self.expected:
+            return "no #-- functions"
+        text = f"{self.written} functions commented"
+        if self.written < self.expected:
+            text += f", {self.expected - self.written} left unchanged (skipped or no usable docstring)"
+        return text
+
+
+def write_files(prepared, modified_funcs, writer="splice", output_mode="function"):
+    """
+    Write the generated functions back to every prepared file.
+
+    :param prepared: List of prepare_file results.
+    :param modified_funcs: Generated outputs, in the order of the functions of prepared.
+    :param writer: "splice" or "astor", see write_commented_file.
+    :param output_mode: "function" or "docstring", see generate_functions.
+    :return: Dictionary of filename to FileResult.
+    """
+    results = {}
+    for (filename, source_code, index, functions, error), file_funcs in zip(prepared, assign_outputs(prepared, modified_funcs)):
+        if error is not None:
+            results[filename] = FileResult(error=error)
+            continue
+        if not functions:
+            results[filename] = FileResult()
+            continue
+        try:
+            written = write_commented_file(filename, source_code, index, file_funcs, writer, output_mode)
+            results[filename] = FileResult(written, len(functions))
+        except Exception as e:
+            results[filename] = FileResult(expected=len(functions), error=str(e))
+    return results
 
 
 if __name__ == '__main__':
     args = parse_args()
+    if args.profile or args.metrics_out:
+        profiler.enable()
     try:
-        with open(args.filename, 'r', encoding='utf-8') as file:
-            source_code = file.read()
-        
-        dic_comments = capture_comments(source_code)
-        functions = find_functions_with_comments(source_code, dic_comments)
-        ast_tree = ast.parse(source_code)
-        
-        #for i in functions:
-        #    print(i)
-        
-        #Loading model up
-        
-        model, tokenizer = load_finedtuned_model()
-        
-        modified_funcs = []
-        for func in functions:
-            mod_func = output_from_model(model, tokenizer, func)
-            modified_funcs.append(mod_func)
-            print(mod_func)
-        
-        transformer = ReplaceFunctionTransformer(dic_comments, modified_funcs)
-        modified_ast = transformer.visit(ast_tree)
-        
-        modified_code = astor.to_source(modified_ast)
-        
-        with open(args.filename, 'w') as file:
-            file.write(modified_code)
-        
+        with profiler.span("find files"):
+            filenames = collect_python_files(args.filename)
+            if args.since:
+                filenames = git_changed_files(filenames, args.since)
+            if args.incremental:
+                manifest = load_manifest(args.manifest)
+                filenames = changed_files(filenames, manifest)
+        if args.dry_run:
+            for filename in filenames:
+                for lineno, name in list_marked_functions(filename):
+                    print(f"{filename}:{lineno}: {name}")
+            sys.exit(0)
+        cache = None if args.no_cache else DocstringCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+        backend = get_backend(args.backend, not args.no_prefix_cache, args.token_budget, **backend_options(args))
+        summary = comment_files(filenames, args.batch_size, args.jobs, cache, args.writer, backend, args.output_mode, not args.no_fast_path)
+        backend.close()
+
+        print(f"Processed {len(summary)} files:")
+        for filename, result in summary.items():
+            print(f"  {filename}: {result}")
+        if cache is not None:
+            print(cache.stats())
+            cache.close()
+        if args.incremental:
+            done = [filename for filename, result in summary.items() if result.finished]
+            save_manifest(args.manifest, update_manifest(manifest, done))
+        if args.profile:
+            print(profiler.report())
+        if args.metrics_out:
+            profiler.write(args.metrics_out)
+
     except Exception as e:
-        print(f"Error processing the file: {e}")
\ No newline at end of file
+        print(f"Error processing the files: {e}")
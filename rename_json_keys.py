@@ -1,37 +1,159 @@
+import argparse
 import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataset_io import is_jsonl, iter_records, write_json_array, write_index
+from inference_backends import instruction_prompt
+
+# The original migration: swap input and output and add the instruction every record needs for training
+legacy_spec = {
+    "rename": {"output": "input", "input": "output"},
+    "set": {"instruction": instruction_prompt},
+    "drop": [],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate the keys of JSON or JSONL datasets, streaming one record at a time.")
+    parser.add_argument("files", nargs="+", help="Dataset files (or shards) to migrate")
+    parser.add_argument("--legacy", action="store_true", help="Apply the original migration: swap input and output and set the instruction")
+    parser.add_argument("--spec", default=None, help="JSON file with 'rename', 'set' and 'drop' entries")
+    parser.add_argument("--rename", action="append", default=[], metavar="OLD=NEW", help="Rename a key (repeatable)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Add or overwrite a field in every record (repeatable)")
+    parser.add_argument("--drop", action="append", default=[], metavar="KEY", help="Remove a key (repeatable)")
+    parser.add_argument("--out-dir", default=None, help="Write migrated files here instead of replacing the inputs")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of processes migrating files in parallel (default: CPU count)")
+    args = parser.parse_args()
+    has_spec = args.spec is not None or args.rename or args.set or args.drop
+    if args.legacy == bool(has_spec):
+        parser.error("give either --legacy, or a migration with --spec, --rename, --set or --drop")
+    return args
+
+
+def build_spec(spec_file=None, renames=(), sets=(), drops=()):
+    """
+    Assemble a migration spec from a spec file and command line entries.
+
+    :return: Dictionary with 'rename' (old -> new), 'set' (key -> value) and 'drop' (list of keys).
+    """
+    spec = {"rename": {}, "set": {}, "drop": []}
+    if spec_file is not None:
+        with open(spec_file, 'r', encoding='utf-8') as file:
+            spec.update(json.load(file))
+    for entry in renames:
+        old, new = entry.split("=", 1)
+        spec["rename"][old] = new
+    for entry in sets:
+        key, value = entry.split("=", 1)
+        spec["set"][key] = value
+    spec["drop"] = list(spec["drop"]) + list(drops)
+    return spec
+
+
+def migrate_record(record, spec):
+    """
+    Apply a migration spec to one record.
+
+    Renames are applied simultaneously, so {"input": "output", "output": "input"} swaps the two
+    fields. Fields from 'set' come first and win over renamed keys of the same name.
+    """
+    migrated = dict(spec["set"])
+    drop = spec["drop"]
+    rename = spec["rename"]
+    for key, value in record.items():
+        if key in drop:
+            continue
+        key = rename.get(key, key)
+        if key not in migrated:
+            migrated[key] = value
+    return migrated
+
+
+def migrate_file(input_file, spec, output_file=None):
+    """
+    Stream the records of a dataset through migrate_record into a new file, then swap it in.
+
+    Memory use does not depend on the size of the dataset. The output is written to a
+    temporary file in the target directory and renamed over the target once complete.
+    :param input_file: JSON array or JSONL dataset.
+    :param spec: Migration spec, see build_spec.
+    :param output_file: Path to write, in the format given by its extension; defaults to input_file.
+    :return: Tuple of (output file, number of records migrated).
+    """
+    output_file = output_file or input_file
+    directory = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".migrate-", suffix=".tmp")
+    try:
+        records = (migrate_record(record, spec) for record in iter_records(input_file))
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            if is_jsonl(output_file):
+                index = {'next_id': 1, 'count': 0}
+                for record in records:
+                    file.write(json.dumps(record) + '\n')
+                    index['count'] += 1
+                    if isinstance(record.get('id'), int):
+                        index['next_id'] = max(index['next_id'], record['id'] + 1)
+                count = index['count']
+            else:
+                count = write_json_array(records, file)
+        if os.path.exists(output_file):
+            os.chmod(tmp_file, os.stat(output_file).st_mode & 0o7777)
+        os.replace(tmp_file, output_file)
+    except BaseException:
+        os.unlink(tmp_file)
+        raise
+    if is_jsonl(output_file):
+        write_index(output_file, index)
+    return output_file, count
+
+
+def _migrate_job(job):
+    input_file, spec, output_file = job
+    try:
+        return (input_file,) + migrate_file(input_file, spec, output_file) + (None,)
+    except Exception as e:
+        return input_file, output_file, 0, str(e)
+
+
+def migrate_files(input_files, spec, out_dir=None, jobs=None):
+    """
+    Migrate several datasets (e.g. the shards of a corpus) in parallel, one process per file.
+
+    :param input_files: Dataset files to migrate.
+    :param spec: Migration spec, see build_spec.
+    :param out_dir: Directory for the migrated files, or None to replace the inputs.
+    :param jobs: Number of worker processes.
+    :return: List of (input file, output file, records migrated, error or None), in input order.
+    """
+    work = [(input_file, spec, os.path.join(out_dir, os.path.basename(input_file)) if out_dir else None)
+            for input_file in input_files]
+    if len(work) == 1:
+        return [_migrate_job(work[0])]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_migrate_job, work))
+
 
 def rename_keys_in_json(file_path):
     """
-    Rename 'prompt' to 'input' and 'completion' to 'output' in a JSON file.
-    
+    Apply the legacy migration to a dataset in place.
+
     Parameters:
-    - file_path: str, the path to the JSON file.
-    """
-    # Read the existing data
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    
-    # Rename the keys
-    updated_data = []
-    for item in data:
-        print(item['output'])
-        break
-        ''' 
-        new_item = {
-            'instruction': "Write detailed and informative comments for the Python function provided. The comments should include a high-level overview of the function's purpose, detailed descriptions of each parameter and what they represent, an explanation of the function's return values, and a line-by-line breakdown of what each part of the code does. The goal is to make the function's operation clear and understandable for someone who may be unfamiliar with the code.",
-            'input': item['output'],
-            'output': item['input'],
-            'imports': item['imports']
-        }
-        updated_data.append(new_item)
-
-    # Write the modified data back to the file
-    with open(file_path, 'w', encoding='utf-8') as file:
-        json.dump(updated_data, file, indent=4)
-    
-    print("File has been updated with new key names.")
-    '''
-# Usage
+    - file_path: str, the path to the JSON or JSONL file.
+    """
+    _, count = migrate_file(file_path, legacy_spec)
+    print(f"File has been updated with new key names ({count} records).")
+
+
 if __name__ == '__main__':
-    path_to_json = 'datasets/dataset_strings.json'  # Specify the JSON file path
-    rename_keys_in_json(path_to_json)
\ No newline at end of file
+    args = parse_args()
+    try:
+        spec = legacy_spec if args.legacy else build_spec(args.spec, args.rename, args.set, args.drop)
+        for input_file, output_file, count, error in migrate_files(args.files, spec, args.out_dir, args.jobs):
+            if error is not None:
+                print(f"{input_file}: error: {error}")
+            else:
+                print(f"{input_file}: {count} records migrated to {output_file or input_file}")
+    except Exception as e:
+        print(f"Error migrating the files: {e}")
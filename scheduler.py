@@ -0,0 +1,52 @@
+def schedule_batches(lengths, batch_size=1, new_tokens=None, token_budget=None):
+    """
+    Group functions of similar prompt length into batches, so little of each batch is padding.
+
+    Functions are sorted by length and packed greedily: a batch is closed when it holds
+    batch_size functions, or when one more row would make rows * (longest prompt + largest
+    max_new_tokens) exceed token_budget. A function that exceeds the budget alone gets its own batch.
+    :param lengths: Prompt length in tokens of each function.
+    :param batch_size: Maximum number of functions per batch.
+    :param new_tokens: Optional max_new_tokens of each function.
+    :param token_budget: Maximum padded tokens per batch, or None for no limit.
+    :return: List of batches, each a list of indices into lengths.
+    """
+    batch_size = max(batch_size, 1)
+    order = sorted(range(len(lengths)), key=lambda i: (lengths[i], new_tokens[i] if new_tokens else 0))
+    batches = []
+    batch, longest, most_new = [], 0, 0
+    for i in order:
+        length = max(longest, lengths[i])
+        new = max(most_new, new_tokens[i] if new_tokens else 0)
+        full = len(batch) >= batch_size or (token_budget is not None and (len(batch) + 1) * (length + new) > token_budget)
+        if batch and full:
+            batches.append(batch)
+            batch, length, new = [], lengths[i], new_tokens[i] if new_tokens else 0
+        batch.append(i)
+        longest, most_new = length, new
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def file_order_batches(count, batch_size=1):
+    """ Batches of consecutive functions, as sent before scheduling. """
+    batch_size = max(batch_size, 1)
+    return [list(range(start, min(start + batch_size, count))) for start in range(0, count, batch_size)]
+
+
+def padding_stats(batches, lengths):
+    """ Tuple of (prompt tokens, prompt tokens including padding) over all batches. """
+    real = sum(lengths[i] for batch in batches for i in batch)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    return real, padded
+
+
+def padding_report(lengths, batches, batch_size=1):
+    """ One-line summary of the padding efficiency of batches, compared with file order batches. """
+    real, padded = padding_stats(batches, lengths)
+    _, file_order_padded = padding_stats(file_order_batches(len(lengths), batch_size), lengths)
+    efficiency = 100.0 * real / padded if padded else 100.0
+    file_order = 100.0 * real / file_order_padded if file_order_padded else 100.0
+    return (f"Scheduler: {len(lengths)} functions in {len(batches)} batches, padding efficiency "
+            f"{efficiency:.1f}% (file order: {file_order:.1f}%)")
@@ -0,0 +1,129 @@
+import ast
+import inspect
+import os
+import tempfile
+
+
+def docstring_from_generated(function_code):
+    """
+    Extract the docstring from a function generated by the model.
+
+    :param function_code: Source of the commented function returned by the model.
+    :return: The docstring, or None if the code is missing, does not parse or has no docstring.
+    """
+    if function_code is None:
+        return None
+    try:
+        body = ast.parse(function_code).body
+    except SyntaxError:
+        return None
+    if not body or not isinstance(body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+    return ast.get_docstring(body[0])
+
+
+def clean_docstring_response(text):
+    """
+    Normalize a docstring generated in docstring output mode.
+
+    :param text: Raw response of the model.
+    :return: The docstring text without surrounding quotes and common indentation, or None if empty.
+    """
+    text = text.strip()
+    for quote in ('"""', "'''"):
+        if text.startswith(quote):
+            text = text[3:]
+            if text.endswith(quote):
+                text = text[:-3]
+    text = inspect.cleandoc(text)
+    return text or None
+
+
+def docstring_prefix(function_code):
+    """
+    Cut generated code right after the function's docstring.
+
+    :param function_code: Partial output of the model, starting with the def line.
+    :return: The code up to the closing quotes, or None if the docstring is not complete yet.
+    """
+    starts = [(function_code.find(quote), quote) for quote in ('"""', "'''") if quote in function_code]
+    if not starts:
+        return None
+    start, quote = min(starts)
+    end = function_code.find(quote, start + 3)
+    if end < 0:
+        return None
+    prefix = function_code[:end + 3]
+    return prefix if docstring_from_generated(prefix) is not None else None
+
+
+def format_docstring(docstring, indent, newline="\n"):
+    """ Render a docstring as a triple-quoted block at the given indentation. """
+    docstring = docstring.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    lines = [indent + '"""']
+    lines.extend(indent + line if line.strip() else "" for line in docstring.splitlines())
+    lines.append(indent + '"""')
+    return newline.join(lines) + newline
+
+
+def replace_marker(function_source, docstring):
+    """ Replace the #-- marker line of a function with the docstring, at the marker's indentation. """
+    lines = function_source.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip() == "#--":
+            indent = line[:len(line) - len(line.lstrip())]
+            lines[i] = format_docstring(docstring, indent).rstrip("\n")
+            break
+    return "\n".join(lines)
+
+
+def splice_docstrings(source_code, docstrings):
+    """
+    Insert docstrings into the original source, copying every other byte verbatim.
+
+    :param source_code: Original file contents.
+    :param docstrings: Dictionary of #-- marker line number (1-based) to (docstring, indent), or to
+        (docstring, indent, (first line, last line) of the existing docstring it replaces).
+    :return: The new file contents.
+    """
+    lines = source_code.splitlines(keepends=True)
+    for lineno in sorted(docstrings, reverse=True):
+        docstring, indent = docstrings[lineno][:2]
+        old_span = docstrings[lineno][2] if len(docstrings[lineno]) > 2 else None
+        if old_span is not None and _owns_lines(lines, old_span):
+            del lines[old_span[0] - 1:old_span[1]] # The old docstring comes after the marker, so lineno stays valid
+        marker_line = lines[lineno - 1]
+        newline = marker_line[len(marker_line.rstrip("\r\n")):] or "\n"
+        block = format_docstring(docstring, indent, newline)
+        if marker_line.strip() == "#--":
+            lines[lineno - 1] = block
+        else:
+            lines.insert(lineno - 1, block)
+    return "".join(lines)
+
+
+def _owns_lines(lines, span):
+    """ True if a string statement starts and ends its lines, i.e. does not follow the def header on the same line. """
+    first, last = lines[span[0] - 1].strip(), lines[span[1] - 1].rstrip("\r\n").rstrip()
+    return first.startswith(('"', "'", 'r', 'R', 'u', 'U')) and last.endswith(('"', "'"))
+
+
+def line_indent(source_lines, lineno):
+    """ Leading whitespace of a line (1-based). """
+    line = source_lines[lineno - 1]
+    return line[:len(line) - len(line.lstrip())]
+
+
+def write_atomic(filename, text):
+    """ Write text to filename through a temporary file, so readers never see a partial file. """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=".autocommenter-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as file:
+            file.write(text)
+        if os.path.exists(filename):
+            os.chmod(tmp_file, os.stat(filename).st_mode & 0o7777)
+        os.replace(tmp_file, filename)
+    except BaseException:
+        os.unlink(tmp_file)
+        raise
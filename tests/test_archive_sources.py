@@ -0,0 +1,61 @@
+import ast
+import io
+import tarfile
+import zipfile
+import pytest
+from archive_sources import iter_source_records, iter_sources
+
+GOOD = b"def add(a, b):\n    return a + b\n"
+LATIN1 = "# -*- coding: latin-1 -*-\ndef café():\n    return 'crème'\n".encode('latin-1')
+BAD_SYNTAX = b"def broken(:\n    pass\n"
+BAD_ENCODING = b"def f():\n    return '\xff\xfe'\n"  # Not utf-8 and no coding line
+
+MEMBERS = {"pkg/good.py": GOOD, "pkg/latin.py": LATIN1, "pkg/README.txt": b"not python"}
+
+
+def function_names(source_code):
+    for node in ast.walk(ast.parse(source_code)):
+        if isinstance(node, ast.FunctionDef):
+            yield node.name
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return str(path)
+
+
+def make_tar(path, members):
+    with tarfile.open(path, 'w:gz') as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+@pytest.mark.parametrize("make_archive, name, bad", [
+    (make_zip, "sources.zip", BAD_SYNTAX),
+    (make_zip, "sources.zip", BAD_ENCODING),
+    (make_tar, "sources.tar.gz", BAD_SYNTAX),
+    (make_tar, "sources.tar.gz", BAD_ENCODING),
+])
+def test_bad_member_is_reported_and_the_rest_is_read(tmp_path, make_archive, name, bad):
+    archive = make_archive(tmp_path / name, {**MEMBERS, "pkg/bad.py": bad})
+    errors = []
+    assert sorted(iter_source_records(archive, function_names, errors)) == ["add", "café"]
+    assert [label for label, _ in errors] == [f"{archive}!pkg/bad.py"]
+
+
+def test_members_are_decoded_with_their_declared_encoding(tmp_path):
+    archive = make_tar(tmp_path / "sources.tar.gz", MEMBERS)
+    sources = {label: source for label, source, _ in iter_sources(archive)}
+    assert sources == {f"{archive}!pkg/good.py": GOOD.decode(), f"{archive}!pkg/latin.py": LATIN1.decode('latin-1')}
+
+
+def test_errors_of_a_plain_file_are_raised(tmp_path):
+    path = tmp_path / "bad.py"
+    path.write_bytes(BAD_SYNTAX)
+    with pytest.raises(SyntaxError):
+        list(iter_source_records(str(path), function_names, []))
@@ -0,0 +1,32 @@
+import json
+import pytest
+from collect_dataset_strings import check_format, records_from_source
+from inference_backends import instruction_prompts
+
+SOURCE = 'def add(a, b):\n    """Add two numbers."""\n    return a + b\n'
+
+
+def write_dataset(path, records):
+    path.write_text(json.dumps(records), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("output_mode", ["docstring", "function"])
+def test_appending_the_same_format_is_allowed(tmp_path, output_mode):
+    path = write_dataset(tmp_path / "data.json", list(records_from_source(SOURCE, output_mode)))
+    check_format(path, output_mode)
+
+
+def test_appending_another_format_is_refused(tmp_path):
+    path = write_dataset(tmp_path / "data.json", list(records_from_source(SOURCE, "function")))
+    with pytest.raises(ValueError, match="another format"):
+        check_format(path, "docstring")
+
+
+def test_datasets_of_the_original_collector_point_to_the_migration(tmp_path):
+    legacy = {"instruction": instruction_prompts["function"], "input": "def add(a, b):\n    #--\n    return a + b",
+              "output": "Add two numbers."}
+    path = write_dataset(tmp_path / "data.json", [legacy])
+    for output_mode in ("docstring", "function"):
+        with pytest.raises(ValueError, match="rename_json_keys.py .* --set \"instruction="):
+            check_format(path, output_mode)
@@ -0,0 +1,56 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("tokenizers")
+
+from inference_backends import (CPUPoolBackend, TransformersBackend, prefix_tokenizes_separately, prompt_parts,
+                                tiny_random_model, tiny_random_tokenizer)
+
+FUNCTIONS = [
+    "def add(a, b):\n    #--\n    return a + b",
+    "def greet(name):\n    #--\n    print('hello', name)\n    return name.upper()",
+    "def first(items):\n    #--\n    return items[0]",
+    "async def fetch(url):\n    #--\n    return await url.read()",
+    "def nothing():\n    #--\n    pass",
+]
+
+
+def test_tiny_tokenizer_is_local_and_splits_like_the_whole_prompt():
+    tokenizer = tiny_random_tokenizer()
+    text = "def f(x):\n    return x  # é"
+    assert tokenizer.decode(tokenizer(text, add_special_tokens=False)["input_ids"]) == text
+    prefix, suffix = prompt_parts()
+    assert prefix_tokenizes_separately(tokenizer, prefix, suffix)
+
+
+def test_tiny_model_is_quantizable():
+    model, _ = tiny_random_model()
+    assert any(isinstance(module, torch.nn.Linear) for module in model.modules())
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    assert not any(type(module) is torch.nn.Linear for module in quantized.modules())
+
+
+def test_pool_of_two_workers_matches_a_single_process():
+    new_tokens = [6] * len(FUNCTIONS)
+    single = TransformersBackend(*tiny_random_model()).generate(FUNCTIONS, 1, new_tokens)
+    backend = CPUPoolBackend(workers=2, threads_per_worker=1, model_factory=tiny_random_model,
+                             tokenizer_factory=tiny_random_tokenizer)
+    try:
+        pooled = backend.generate(FUNCTIONS, 1, new_tokens)
+    finally:
+        backend.close()
+    assert pooled == single # Greedy decoding with the same seeded weights, in the original order
+    assert len(backend.token_stats) == len(FUNCTIONS)
+    assert backend.schedule_report.count("Worker") == 2
+
+
+def test_quantized_pool_returns_one_response_per_function():
+    backend = CPUPoolBackend(workers=2, threads_per_worker=1, quantize=True, model_factory=tiny_random_model,
+                             tokenizer_factory=tiny_random_tokenizer)
+    try:
+        responses = backend.generate(FUNCTIONS, 2, [4] * len(FUNCTIONS))
+    finally:
+        backend.close()
+    assert len(responses) == len(FUNCTIONS)
+    assert all(isinstance(res, str) for res in responses)
@@ -0,0 +1,75 @@
+import json
+import pytest
+from dataset_io import append_json_array, append_jsonl, iter_json_array, iter_jsonl, read_index, write_json_array
+
+RECORDS = [
+    {"id": 1, "input": "def f():\n    return '[1, 2]'", "output": "Say \"hi\" é中"},
+    12345678901234567890,
+    -3.5e-7,
+    "plain ] string, with , separators",
+    [],
+    {},
+    [{"nested": [1, {"deeper": None}]}, True, False],
+    None,
+    42,
+]
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+def test_iter_json_array_at_every_chunk_boundary(tmp_path, indent):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(RECORDS, indent=indent, ensure_ascii=False), encoding="utf-8")
+    for chunk_size in range(1, 40):
+        assert list(iter_json_array(str(path), chunk_size)) == RECORDS
+
+
+def test_iter_json_array_number_at_chunk_end(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("[1234, 56]", encoding="utf-8")
+    assert list(iter_json_array(str(path), chunk_size=5)) == [1234, 56] # "[1234" ends a chunk mid-number
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n]\n"])
+def test_iter_json_array_empty(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text, encoding="utf-8")
+    assert list(iter_json_array(str(path), chunk_size=1)) == []
+
+
+@pytest.mark.parametrize("text", ["{}", "[1 2]", "[1,", ""])
+def test_iter_json_array_rejects_malformed_files(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), chunk_size=2))
+
+
+def test_write_json_array_matches_json_dump(tmp_path):
+    path = tmp_path / "data.json"
+    with open(path, "w", encoding="utf-8") as file:
+        assert write_json_array(iter(RECORDS), file) == len(RECORDS)
+    assert path.read_text(encoding="utf-8") == json.dumps(RECORDS, indent=4)
+
+
+
+def test_append_json_array_assigns_ids(tmp_path):
+    path = tmp_path / "data.json"
+    assert append_json_array([{"input": "a"}], str(path), assign_ids=True) == 1
+    assert append_json_array(iter([{"input": "b"}, {"input": "c"}]), str(path), assign_ids=True) == 2
+    assert [record["id"] for record in json.loads(path.read_text(encoding="utf-8"))] == [1, 2, 3]
+
+
+def test_append_jsonl_keeps_ids_unique_after_a_failed_append(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    append_jsonl([{"input": "a"}], path)
+
+    def failing():
+        yield {"input": "b"}
+        yield {"input": "c"}
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        append_jsonl(failing(), path)
+    append_jsonl([{"input": "d"}], path)
+    assert [record["id"] for record in iter_jsonl(path)] == [1, 2, 3, 4]
+    assert read_index(path) == {"next_id": 5, "count": 4}
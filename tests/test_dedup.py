@@ -0,0 +1,46 @@
+from dedup import Deduplicator
+
+FUNCTION = '''def total_price(items, tax_rate):
+    #--
+    subtotal = sum(item.price * item.quantity for item in items)
+    discount = 0.1 * subtotal if subtotal > 100 else 0.0
+    taxed = (subtotal - discount) * (1 + tax_rate)
+    shipping = 0.0 if taxed > 50 else 4.99
+    return round(taxed + shipping, 2)'''
+
+# Same function with only whitespace changed
+REFORMATTED = FUNCTION.replace("    ", "\t").replace(" = ", "  =  ") + "\n\n"
+
+# Same function with one line changed
+NEAR = FUNCTION.replace("return round(taxed + shipping, 2)", "return round(taxed + shipping, 3)")
+
+UNRELATED = '''def parse_header(line):
+    #--
+    key, _, value = line.partition(":")
+    return key.strip().lower(), value.strip()'''
+
+
+def test_each_tier_removes_its_duplicates(tmp_path):
+    dedup = Deduplicator(str(tmp_path / "index.sqlite3"))
+    records = [{'input': text} for text in (FUNCTION, REFORMATTED, NEAR, UNRELATED)]
+    assert [record['input'] for record in dedup.filter(records)] == [FUNCTION, UNRELATED]
+    assert (dedup.kept, dedup.exact_removed, dedup.near_removed) == (2, 1, 1)
+    assert dedup.stats() == "Dedup: kept 2, removed 1 exact and 1 near duplicates"
+    dedup.close()
+
+
+def test_index_persists_across_runs(tmp_path):
+    index_file = str(tmp_path / "index.sqlite3")
+    first = Deduplicator(index_file)
+    assert list(first.filter([{'input': FUNCTION}])) == [{'input': FUNCTION}]
+    first.close()
+    second = Deduplicator(index_file)
+    assert [second.check({'input': text}) for text in (REFORMATTED, NEAR, UNRELATED)] == ['exact', 'near', None]
+    second.close()
+
+
+def test_field_selects_the_compared_text(tmp_path):
+    dedup = Deduplicator(str(tmp_path / "index.sqlite3"), field='output')
+    records = [{'input': FUNCTION, 'output': "Compute the total."}, {'input': FUNCTION, 'output': "Parse a header."}]
+    assert list(dedup.filter(records)) == records
+    dedup.close()
@@ -0,0 +1,47 @@
+import itertools
+import pytest
+import docstring_cache
+from docstring_cache import DocstringCache, cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ Give every lookup and insertion its own timestamp, so LRU order never ties. """
+    ticks = itertools.count(1)
+    monkeypatch.setattr(docstring_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = DocstringCache(str(tmp_path), max_bytes=30)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.put("c", "z" * 10)
+    assert cache.total_bytes == 30
+    assert cache.get("a") == "x" * 10  # "b" is now the least recently used
+    cache.put("d", "w" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["x" * 10, "z" * 10, "w" * 10]
+    assert cache.total_bytes == 30
+    assert (cache.hits, cache.misses) == (4, 1)
+    assert cache.stats() == "Docstring cache: 4 hits, 1 misses (80.0% hit rate)"
+    cache.close()
+
+
+def test_replacing_an_entry_counts_its_size_once(tmp_path, clock):
+    cache = DocstringCache(str(tmp_path), max_bytes=100)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 25)
+    assert cache.total_bytes == 25
+    cache.close()
+    reopened = DocstringCache(str(tmp_path), max_bytes=100)
+    assert reopened.total_bytes == 25
+    assert reopened.get("a") == "x" * 25
+    reopened.close()
+
+
+def test_cache_key_ignores_whitespace_only_changes():
+    params = {"max_new_tokens": 64}
+    key = cache_key("def f():\n    return 1\n", "model", params)
+    assert cache_key("\ndef f():   \n\n    return 1", "model", params) == key
+    assert cache_key("def f():\n    return 2\n", "model", params) != key
+    assert cache_key("def f():\n    return 1\n", "other-model", params) != key
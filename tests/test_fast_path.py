@@ -0,0 +1,45 @@
+from fast_path import trivial_docstring
+
+
+def test_getter():
+    assert trivial_docstring("def get_name(self):\n    return self._name") == \
+        "Return the name of the object.\n\n:return: Value of self._name."
+
+
+def test_property():
+    assert trivial_docstring("@property\ndef size(self):\n    return self.size_bytes") == "The size bytes of the object."
+
+
+def test_setter():
+    assert trivial_docstring("def set_name(self, name):\n    self._name = name") == \
+        "Set the name of the object.\n\n:param name: New value of the name."
+
+
+def test_pass_through():
+    docstring = trivial_docstring("def load(path, mode):\n    return open(path, mode)")
+    assert docstring.startswith("Call open with the same arguments")
+    assert ":param path: Passed on to open." in docstring
+
+
+def test_constant_keeps_its_case():
+    assert trivial_docstring("def flag():\n    return True").startswith("Return the constant True.")
+
+
+def test_not_implemented():
+    assert trivial_docstring("def run(self):\n    raise NotImplementedError").startswith("Not implemented here")
+
+
+def test_non_trivial_functions_go_to_the_model():
+    assert trivial_docstring("def add(a, b):\n    total = a + b\n    return total") is None
+    assert trivial_docstring("def twice(a):\n    return f(a, a)") is None
+    assert trivial_docstring("def partial(a, b):\n    return f(a)") is None
+    assert trivial_docstring("def broken(:\n    pass") is None
+
+
+def test_pass_through_must_keep_the_parameter_order():
+    assert trivial_docstring("def swap(a, b):\n    return f(b, a)") is None
+    assert trivial_docstring("def rename(a, k):\n    return f(a, other=k)") is None
+    docstring = trivial_docstring("def wrap(a, *args, k, **kwargs):\n    return f(a, *args, k=k, **kwargs)")
+    assert docstring.startswith("Call f with the same arguments")
+    assert [line.split(":")[1] for line in docstring.splitlines() if line.startswith(":param")] == \
+        ["param a", "param args", "param k", "param kwargs"]
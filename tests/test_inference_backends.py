@@ -0,0 +1,23 @@
+from inference_backends import TransformersBackend, UnslothBackend, prefix_tokenizes_separately, prompt_parts
+
+
+class CharTokenizer:
+    """ One id per character, optionally with a leading-space piece on every text like SentencePiece. """
+
+    def __init__(self, leading_space=False):
+        self.leading_space = leading_space
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = ([1] if add_special_tokens else []) + ([9601] if self.leading_space else [])
+        return {"input_ids": ids + [ord(char) for char in text]}
+
+
+def test_split_prompt_check():
+    prefix, suffix = prompt_parts()
+    assert prefix_tokenizes_separately(CharTokenizer(), prefix, suffix)
+    assert not prefix_tokenizes_separately(CharTokenizer(leading_space=True), prefix, suffix)
+
+
+def test_unsloth_never_uses_the_prefix_cache():
+    assert TransformersBackend(use_prefix_cache=True).prefix_cache_enabled()
+    assert not UnslothBackend(use_prefix_cache=True).prefix_cache_enabled()
@@ -0,0 +1,30 @@
+import pytest
+from inference_backends import StubBackend
+from profiling import profiler
+from python_autocommenter import generate_functions
+
+
+class BudgetedStub(StubBackend):
+    """ Stub backend reporting (generated, budgeted) new tokens like the model backends. """
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        self.token_stats = [(10 * (i + 1), budget) for i, budget in enumerate(new_tokens)]
+        return super().generate(functions, batch_size, new_tokens, stop_at_docstring, output_mode)
+
+
+@pytest.fixture
+def enabled_profiler():
+    profiler.reset()
+    profiler.enable()
+    yield profiler
+    profiler.enabled = False
+    profiler.reset()
+
+
+def test_token_budget_of_each_function_is_in_the_metrics(enabled_profiler):
+    functions = ["def add(a, b):\n    #--\n    return a + b", "def mul(a, b):\n    #--\n    return a * b"]
+    generate_functions(functions, backend=BudgetedStub(), fast_path=False)
+    budgets = enabled_profiler.to_dict()["token_budgets"]
+    assert [entry["name"] for entry in budgets] == ["add", "mul"]
+    assert [entry["generated_tokens"] for entry in budgets] == [10, 20]
+    assert all(entry["saved_tokens"] == entry["budget_tokens"] - entry["generated_tokens"] for entry in budgets)
@@ -0,0 +1,29 @@
+import random
+from scheduler import schedule_batches
+
+
+def test_every_function_is_scheduled_once():
+    rng = random.Random(0)
+    lengths = [rng.randint(1, 500) for _ in range(200)]
+    batches = schedule_batches(lengths, batch_size=8)
+    assert sorted(i for batch in batches for i in batch) == list(range(200))
+    assert all(len(batch) <= 8 for batch in batches)
+
+
+def test_batches_hold_similar_lengths():
+    lengths = [10, 500, 11, 490, 12, 480]
+    assert schedule_batches(lengths, batch_size=3) == [[0, 2, 4], [5, 3, 1]]
+
+
+def test_token_budget_limits_padded_tokens():
+    rng = random.Random(1)
+    lengths = [rng.randint(1, 300) for _ in range(100)]
+    new_tokens = [rng.randint(1, 200) for _ in range(100)]
+    batches = schedule_batches(lengths, batch_size=16, new_tokens=new_tokens, token_budget=2000)
+    for batch in batches:
+        padded = len(batch) * (max(lengths[i] for i in batch) + max(new_tokens[i] for i in batch))
+        assert padded <= 2000 or len(batch) == 1
+
+
+def test_oversized_function_gets_its_own_batch():
+    assert schedule_batches([5, 5000, 6], batch_size=4, token_budget=100) == [[0, 2], [1]]
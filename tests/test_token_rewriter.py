@@ -0,0 +1,44 @@
+import collect_dataset
+import collect_dataset_strings
+import pytest
+from token_rewriter import TokenRewriter
+
+FUNCTION = '''def outer(items, limit=3):
+    """Outer docstring."""
+    total = 0  # running total
+    for item in items:
+        if item > limit:
+            def scale(x):
+                """Scale x.
+
+                Nested docstring spanning lines.
+                """
+                # double it
+                return x * 2
+            total += scale(item)
+        else:
+            total -= 1  # penalty
+    return total'''
+
+# Output of the tokenize loops the rewriter replaced, recorded from the original transform_function and do_file
+TRANSFORMED = ('def outer(items, limit=3):\n    #--\n    total = 0  ##\n\n    for item in items:\n        if item > limit:\n'
+               '            def scale(x):\n                #--\n                ##\n\n                return x * 2\n'
+               '            total += scale(item)\n        else:\n            total -= 1  ##\n\n    return total')
+DO_FILE = '\n' + TRANSFORMED + '\ndef g():\n    #--\n    return 1  ##\n'
+
+
+@pytest.mark.parametrize("module", [collect_dataset, collect_dataset_strings])
+def test_transform_function_matches_the_original_output(module):
+    assert module.transform_function(FUNCTION) == TRANSFORMED
+
+
+@pytest.mark.parametrize("module", [collect_dataset, collect_dataset_strings])
+def test_do_file_matches_the_original_output(tmp_path, module):
+    written = module.do_file([FUNCTION, "def g():\n    'doc'\n    return 1  # one"], str(tmp_path / "functions.py"))
+    with open(written, encoding="utf-8") as file:
+        assert file.read() == DO_FILE
+
+
+def test_markers_are_captured_in_the_same_pass():
+    rewriter = TokenRewriter(capture_markers=True).feed("def f():\n    #--\n    return 1  # other\n")
+    assert rewriter.comments == {2: "#--"}
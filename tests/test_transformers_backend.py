@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("tokenizers")
+
+from inference_backends import TransformersBackend, tiny_random_model
+
+# Different lengths, so batches need padding and the scheduler reorders them
+FUNCTIONS = [
+    "def add(a, b):\n    #--\n    return a + b",
+    "def greet(name):\n    #--\n    message = 'hello ' + name\n    print(message)\n    return message.upper()",
+    "def first(items):\n    #--\n    return items[0]",
+    "async def fetch(url):\n    #--\n    return await url.read()",
+    "def nothing():\n    #--\n    pass",
+    "def total(rows, key=None):\n    #--\n    values = [row[key] if key else row for row in rows]\n    return sum(values)",
+]
+NEW_TOKENS = [8] * len(FUNCTIONS)
+
+
+def test_batched_generation_matches_one_function_at_a_time():
+    backend = TransformersBackend(*tiny_random_model())
+    serial = backend.generate(FUNCTIONS, 1, NEW_TOKENS)
+    batched = backend.generate(FUNCTIONS, 4, NEW_TOKENS)
+    assert batched == serial
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_prefix_cache_does_not_change_the_output(batch_size):
+    model, tokenizer = tiny_random_model()
+    cached = TransformersBackend(model, tokenizer, use_prefix_cache=True)
+    uncached = TransformersBackend(model, tokenizer, use_prefix_cache=False)
+    assert cached.generate(FUNCTIONS, batch_size, NEW_TOKENS) == uncached.generate(FUNCTIONS, batch_size, NEW_TOKENS)
+    assert cached.prefix_cache["function"] is not None # The cached path was really taken
+
@@ -0,0 +1,212 @@
+import ast
+import pytest
+from inference_backends import StubBackend
+from function_index import FunctionIndex
+from python_autocommenter import comment_files, list_marked_functions, prepare_file
+from span_writer import splice_docstrings
+
+SOURCE = '''\
+import functools
+
+
+def outer(a):
+    #--
+    def inner(b):
+        #--
+        return b * 2
+    return inner(a) + 1
+
+
+class Thing:
+    def method(self, x, y):
+        #--
+        total = x + y
+        return total * 3
+
+    @functools.lru_cache()
+    def cached(self, key):
+        #--
+        value = key.upper()
+        return value + "!"
+
+    def plain(self):
+        return 0
+
+
+async def fetch(url):
+    #--
+    data = await url.read()
+    return data
+'''
+
+
+def docstrings(source):
+    """ Map each function's qualified name to its docstring. """
+    found = {}
+
+    def visit(node, scope):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = ".".join(scope + [child.name])
+                found[name] = ast.get_docstring(child)
+                visit(child, scope + [child.name])
+            elif isinstance(child, ast.ClassDef):
+                visit(child, scope + [child.name])
+
+    visit(ast.parse(source), [])
+    return found
+
+
+@pytest.mark.parametrize("writer", ["splice", "astor"])
+@pytest.mark.parametrize("output_mode", ["function", "docstring"])
+def test_nested_functions_and_methods_get_their_own_docstrings(tmp_path, writer, output_mode):
+    path = tmp_path / "module.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    summary = comment_files([str(path)], jobs=1, writer=writer, backend=StubBackend(), output_mode=output_mode, fast_path=False)
+    assert str(summary[str(path)]) == "5 functions commented"
+    assert summary[str(path)].finished
+
+    result = path.read_text(encoding="utf-8")
+    assert "#--" not in result
+    found = docstrings(result)
+    assert found["outer"].startswith("Stub docstring for outer.")
+    assert ":param a:" in found["outer"]
+    assert found["outer.inner"].startswith("Stub docstring for inner.")
+    assert ":param b:" in found["outer.inner"]
+    assert found["Thing.method"].startswith("Stub docstring for method.")
+    assert ":param y:" in found["Thing.method"]
+    assert found["Thing.cached"].startswith("Stub docstring for cached.")
+    assert found["Thing.plain"] is None
+    assert found["fetch"].startswith("Stub docstring for fetch.")
+    # Bodies survive with both writers
+    assert "return inner(a) + 1" in result
+    assert "return total * 3" in result
+    assert "lru_cache" in result
+
+
+def test_splice_writer_keeps_every_other_line(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    comment_files([str(path)], jobs=1, backend=StubBackend(), fast_path=False)
+    result = path.read_text(encoding="utf-8")
+    original = [line for line in SOURCE.splitlines() if line.strip() != "#--"]
+    kept = iter(result.splitlines())
+    assert all(any(line == other for other in kept) for line in original) # Original lines appear in order
+
+
+def test_prepare_file_indexes_nested_functions_in_source_order(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    _, _, index, functions, error = prepare_file(str(path))
+    assert error is None
+    assert [index[id].qualname for id in functions] == ["outer", "outer.<locals>.inner", "Thing.method", "Thing.cached", "fetch"]
+
+
+def test_splice_keeps_crlf_line_endings(tmp_path):
+    source = "def f(a):\r\n    #--\r\n    return a\r\n\r\ndef g():\r\n    pass\r\n"
+    result = splice_docstrings(source, {2: ("Return a.\n\n:param a: Value.", "    ")})
+    assert result == ('def f(a):\r\n    """\r\n    Return a.\r\n\r\n    :param a: Value.\r\n    """\r\n'
+                      '    return a\r\n\r\ndef g():\r\n    pass\r\n')
+
+
+def test_crlf_file_round_trips_through_the_splice_writer(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_bytes(SOURCE.replace("\n", "\r\n").encode("utf-8"))
+    comment_files([str(path)], jobs=1, backend=StubBackend(), fast_path=False)
+    data = path.read_bytes()
+    assert b"\n" not in data.replace(b"\r\n", b"")
+    assert docstrings(data.decode("utf-8"))["outer.inner"].startswith("Stub docstring for inner.")
+
+
+def test_deep_expression_in_an_unmarked_function(tmp_path):
+    path = tmp_path / "generated.py"
+    path.write_text("def table():\n    return " + " + ".join(["1"] * 1500) + "\n\n\ndef add(a, b):\n    #--\n    return a + b\n",
+                    encoding="utf-8")
+    assert list_marked_functions(str(path)) == [(5, "add")]
+    summary = comment_files([str(path)], jobs=1, backend=StubBackend(), fast_path=False)
+    assert str(summary[str(path)]) == "1 functions commented"
+
+
+def test_functions_in_compound_statements_are_indexed_in_source_order():
+    source = ("try:\n    def a(): pass\nexcept E:\n    def b(): pass\nelse:\n    def c(): pass\nfinally:\n    def d(): pass\n"
+              "for x in y:\n    def e(): pass\nelse:\n    def f(): pass\nmatch z:\n    case 1:\n        def g(): pass\n")
+    index, _ = FunctionIndex.build(ast.parse(source), {})
+    assert [record.qualname for record in index.records] == list("abcdefg")
+
+
+EXISTING = '''\
+def compute(a, b):
+    #--
+    """already there"""
+    return a + b
+
+
+def only(a):
+    #--
+    """
+    Old.
+    """
+
+
+def inline(a): """kept, shares the def line"""; return a
+'''
+
+
+def string_statements(source):
+    """ Number of leading string statements of each function. """
+    counts = {}
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.FunctionDef):
+            counts[node.name] = sum(1 for statement in node.body
+                                    if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant))
+    return counts
+
+
+@pytest.mark.parametrize("writer", ["splice", "astor"])
+@pytest.mark.parametrize("output_mode", ["function", "docstring"])
+def test_existing_docstring_is_replaced(tmp_path, writer, output_mode):
+    path = tmp_path / "module.py"
+    path.write_text(EXISTING, encoding="utf-8")
+    comment_files([str(path)], jobs=1, writer=writer, backend=StubBackend(), output_mode=output_mode, fast_path=False)
+    result = path.read_text(encoding="utf-8")
+    assert string_statements(result) == {"compute": 1, "only": 1, "inline": 1}
+    assert "already there" not in result and "Old." not in result
+    found = docstrings(result)
+    assert found["compute"].startswith("Stub docstring for compute.")
+    assert found["only"].startswith("Stub docstring for only.")
+    assert "return a + b" in result
+
+
+def test_astor_writer_replaces_the_docstring_of_an_outer_function_with_marked_nested_ones(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text('def outer(a):\n    #--\n    """Old."""\n    def inner(b):\n        #--\n        return b\n    return inner(a)\n',
+                    encoding="utf-8")
+    comment_files([str(path)], jobs=1, writer="astor", backend=StubBackend(), fast_path=False)
+    result = path.read_text(encoding="utf-8")
+    assert string_statements(result) == {"outer": 1, "inner": 1}
+    assert docstrings(result)["outer"].startswith("Stub docstring for outer.")
+
+
+class NoDocstringFor(StubBackend):
+    """ Stub backend whose reply for one function has no usable docstring. """
+
+    def __init__(self, name):
+        self.name_without_docstring = name
+
+    def generate(self, functions, batch_size=1, new_tokens=None, stop_at_docstring=False, output_mode="function"):
+        responses = super().generate(functions, batch_size, new_tokens, stop_at_docstring, output_mode)
+        return [None if f"def {self.name_without_docstring}(" in func else res for func, res in zip(functions, responses)]
+
+
+def test_partly_commented_file_is_not_finished(tmp_path):
+    done, partial, broken = tmp_path / "done.py", tmp_path / "partial.py", tmp_path / "broken.py"
+    done.write_text("def add(a, b):\n    #--\n    return a + b\n", encoding="utf-8")
+    partial.write_text("def sub(a, b):\n    #--\n    return a - b\n\n\ndef mul(a, b):\n    #--\n    return a * b\n", encoding="utf-8")
+    broken.write_text("def oops(:\n    #--\n", encoding="utf-8")
+    summary = comment_files([str(done), str(partial), str(broken)], jobs=1, backend=NoDocstringFor("mul"), fast_path=False)
+    assert summary[str(done)].finished
+    assert not summary[str(partial)].finished
+    assert (summary[str(partial)].written, summary[str(partial)].expected) == (1, 2)
+    assert str(summary[str(partial)]).startswith("1 functions commented, 1 left unchanged")
+    assert not summary[str(broken)].finished
+    assert str(summary[str(broken)]).startswith("error: ")
@@ -0,0 +1,94 @@
+import token
+import tokenize
+from io import StringIO
+
+
+def docstring_to_marker(toktype, ttext, prev_toktype):
+    """ Replace a docstring (a string right after an INDENT) with the #-- marker. """
+    if toktype == token.STRING and prev_toktype == token.INDENT:
+        return "#--"
+    return None
+
+
+def comment_to_marker(toktype, ttext, prev_toktype):
+    """ Replace every comment with ## and a line break. """
+    if toktype == tokenize.COMMENT:
+        return "##\n"
+    return None
+
+
+# Rules used by transform_function and do_file to build model inputs
+TRANSFORM_RULES = (docstring_to_marker, comment_to_marker)
+
+
+class TokenRewriter:
+    """
+    Streaming token rewriter shared by transform_function, do_file and capture_comments.
+
+    Each source fed to the rewriter is tokenized once. Every token goes through the rules
+    in order; the first rule that returns a string replaces the token text, otherwise the
+    token is copied. Output is collected in a list and joined once, so the cost is linear
+    in the size of the input. With capture_markers, the line numbers of #-- comments are
+    recorded in the same pass.
+    """
+
+    def __init__(self, rules=TRANSFORM_RULES, capture_markers=False, emit=True):
+        """
+        :param rules: Sequence of functions (toktype, ttext, prev_toktype) -> replacement text or None.
+        :param capture_markers: Record #-- comments in self.comments, keyed by line number.
+        :param emit: Build the rewritten text; turn off when only the comments are needed.
+        """
+        self.rules = rules
+        self.capture_markers = capture_markers
+        self.emit = emit
+        self.comments = {}
+        self.buffer = []
+        self.last_lineno = -1
+        self.last_col = 0
+
+    def feed(self, source):
+        """
+        Rewrite one piece of source code, appending to the output buffer.
+
+        Column bookkeeping carries over between calls, like the original do_file loop
+        writing several functions into one file.
+        :param source: Python source code.
+        :return: self, so calls can be chained.
+        """
+        out = self.buffer.append
+        rules = self.rules
+        emit = self.emit
+        capture = self.capture_markers
+        last_lineno = self.last_lineno
+        last_col = self.last_col
+        prev_toktype = tokenize.INDENT
+        for toktype, ttext, (slineno, scol), (elineno, ecol), _ in tokenize.generate_tokens(StringIO(source).readline):
+            if capture and toktype == tokenize.COMMENT and ttext == "#--":
+                self.comments[slineno] = ttext  # Store line number and comment
+            if emit:
+                if slineno > last_lineno:
+                    last_col = 0
+                if scol > last_col:
+                    out(" " * (scol - last_col))
+                for rule in rules:
+                    replacement = rule(toktype, ttext, prev_toktype)
+                    if replacement is not None:
+                        out(replacement)
+                        break
+                else:
+                    out(ttext)
+            prev_toktype = toktype
+            last_col = ecol
+            last_lineno = elineno
+        self.last_lineno = last_lineno
+        self.last_col = last_col
+        return self
+
+    def drain(self):
+        """ Return the text rewritten so far and empty the buffer. """
+        text = "".join(self.buffer)
+        self.buffer = []
+        return text
+
+    def text(self):
+        return "".join(self.buffer)
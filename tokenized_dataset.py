@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+from array import array
+from dataset_io import iter_records
+from incremental import file_fingerprint
+from inference_backends import alpaca_prompt, model_name
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tokenize a dataset once into a memory-mapped token file for training.")
+    parser.add_argument("input_file", help="JSON or JSONL dataset with instruction, input and output fields")
+    parser.add_argument("output_prefix", help="Prefix of the .tokens, .offsets and .meta.json files to write")
+    parser.add_argument("--tokenizer", default=model_name, help="Name or path of the tokenizer (default: the model)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records tokenized per tokenizer call")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the export is up to date")
+    return parser.parse_args()
+
+
+def export_paths(prefix):
+    """ Paths of the token ids, offsets and metadata files of an export. """
+    return prefix + '.tokens', prefix + '.offsets', prefix + '.meta.json'
+
+
+def format_record(record, eos_token=""):
+    """ Training text of a record: the alpaca prompt with the response filled in, ended by EOS. """
+    return alpaca_prompt.format(record['instruction'], record['input'], record['output']) + eos_token
+
+
+def tokenizer_fingerprint(tokenizer):
+    """ Hash of everything about the tokenizer that changes the token ids. """
+    digest = hashlib.sha256()
+    digest.update(type(tokenizer).__name__.encode('utf-8'))
+    digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(alpaca_prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_meta(prefix):
+    meta_file = export_paths(prefix)[2]
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def is_up_to_date(prefix, dataset_file, tokenizer_hash):
+    """ True if the export was built from the same dataset contents with the same tokenizer. """
+    meta = load_meta(prefix)
+    if meta is None or meta['tokenizer'] != tokenizer_hash:
+        return False
+    if not all(os.path.exists(path) for path in export_paths(prefix)[:2]):
+        return False
+    source = meta['source']
+    stat = os.stat(dataset_file)
+    if stat.st_size == source['size'] and stat.st_mtime_ns == source['mtime_ns']:
+        return True
+    return file_fingerprint(dataset_file)['sha256'] == source['sha256']
+
+
+def export_tokenized(dataset_file, prefix, tokenizer, batch_size=1000):
+    """
+    Tokenize every record of a dataset and write the ids as one flat array plus offsets.
+
+    Record i spans tokens[offsets[i]:offsets[i + 1]]. Ids are stored as uint16 when the
+    vocabulary fits, uint32 otherwise. The metadata file is written last, so an interrupted
+    export is never mistaken for a complete one.
+    :param dataset_file: JSON or JSONL dataset.
+    :param prefix: Prefix of the files to write.
+    :param tokenizer: Tokenizer of the model to train.
+    :param batch_size: Records tokenized per tokenizer call.
+    :return: The metadata dictionary of the export.
+    """
+    tokens_file, offsets_file, meta_file = export_paths(prefix)
+    typecode = 'H' if len(tokenizer) <= 1 << 16 else 'I'
+    eos_token = tokenizer.eos_token or ""
+    offsets = array('Q', [0])
+    directory = os.path.dirname(os.path.abspath(prefix))
+    os.makedirs(directory, exist_ok=True)
+
+    def flush(texts, file):
+        for ids in tokenizer(texts, add_special_tokens=True)["input_ids"]:
+            array(typecode, ids).tofile(file)
+            offsets.append(offsets[-1] + len(ids))
+
+    with open(tokens_file + '.tmp', 'wb') as file:
+        texts = []
+        for record in iter_records(dataset_file):
+            texts.append(format_record(record, eos_token))
+            if len(texts) >= batch_size:
+                flush(texts, file)
+                texts = []
+        if texts:
+            flush(texts, file)
+    with open(offsets_file + '.tmp', 'wb') as file:
+        offsets.tofile(file)
+    os.replace(tokens_file + '.tmp', tokens_file)
+    os.replace(offsets_file + '.tmp', offsets_file)
+
+    meta = {
+        'source': file_fingerprint(dataset_file),
+        'tokenizer': tokenizer_fingerprint(tokenizer),
+        'typecode': typecode,
+        'records': len(offsets) - 1,
+        'tokens': offsets[-1],
+    }
+    with open(meta_file + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=4)
+    os.replace(meta_file + '.tmp', meta_file)
+    return meta
+
+
+def build_if_stale(dataset_file, prefix, tokenizer, batch_size=1000, force=False):
+    """
+    Export the dataset unless an export of the same data and tokenizer already exists.
+
+    :return: Tuple of (metadata, True if the export was rebuilt).
+    """
+    if not force and is_up_to_date(prefix, dataset_file, tokenizer_fingerprint(tokenizer)):
+        return load_meta(prefix), False
+    return export_tokenized(dataset_file, prefix, tokenizer, batch_size), True
+
+
+class TokenizedDataset:
+    """
+    Read-only, memory-mapped view of an export, for training loaders.
+
+    Records are memoryview slices of the mapped file, so indexing copies nothing;
+    numpy.frombuffer or torch.frombuffer can wrap them directly.
+    """
+
+    def __init__(self, prefix):
+        tokens_file, offsets_file, _ = export_paths(prefix)
+        meta = load_meta(prefix)
+        if meta is None:
+            raise FileNotFoundError(f"No tokenized export at {prefix}")
+        self.meta = meta
+        self._files = [open(tokens_file, 'rb'), open(offsets_file, 'rb')]
+        self._maps = [mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else None
+                      for file in self._files]
+        self.tokens = memoryview(self._maps[0] or b"").cast(meta['typecode'])
+        self.offsets = memoryview(self._maps[1]).cast('Q')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def close(self):
+        self.tokens.release()
+        self.offsets.release()
+        for mapped in self._maps:
+            if mapped is not None:
+                mapped.close()
+        for file in self._files:
+            file.close()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        from transformers import AutoTokenizer # Imported here so --help never pays for it
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        meta, rebuilt = build_if_stale(args.input_file, args.output_prefix, tokenizer, args.batch_size, args.force)
+        state = "Exported" if rebuilt else "Up to date:"
+        print(f"{state} {meta['records']} records, {meta['tokens']} tokens in {args.output_prefix}.tokens")
+    except Exception as e:
+        print(f"Error exporting the dataset: {e}")